@@ -5,11 +5,112 @@ Fast screen capture using mss library
 """
 
 import logging
+import threading
+import time
+import numpy as np
 from PIL import Image
 import mss
 
 logger = logging.getLogger(__name__)
 
+# Opaque alpha mask, OR-ed in because some backends leave BGRX padding at 0
+_ALPHA_MASK = np.uint32(0xFF000000)
+
+
+def _shot_to_pil(screenshot) -> Image.Image:
+    """
+    Convert an mss screenshot (BGRA) to a PIL RGBA image.
+
+    Each little-endian BGRA pixel reads as 0xAARRGGBB; a byte swap followed
+    by a rotate-right of 8 bits yields 0xAABBGGRR, i.e. RGBA in memory.
+    Done as a single vectorized pass instead of PIL's per-pixel BGRX unpack.
+    """
+    width, height = screenshot.size
+    arr = np.frombuffer(screenshot.raw, dtype=np.uint32).reshape(height, width)
+    swapped = arr.byteswap()
+    rgba = (swapped >> 8) | (swapped << 24) | _ALPHA_MASK
+    return Image.frombuffer('RGBA', screenshot.size, rgba, 'raw', 'RGBA', 0, 1)
+
+
+# ── Cached mss handle ───────────────────────────────────────────
+# mss handles are bound to the thread that created them (GDI DCs / X display),
+# so each thread keeps its own instance instead of reopening one per capture.
+
+MONITOR_REFRESH_INTERVAL = 5.0  # seconds between monitor list re-queries
+_GRID_SHIFT = 8  # 256-pixel cells for the monitor lookup grid
+
+_tls = threading.local()
+
+
+def _get_sct():
+    """Return this thread's mss instance, creating it on first use."""
+    sct = getattr(_tls, 'sct', None)
+    if sct is None:
+        sct = mss.mss()
+        _tls.sct = sct
+        _tls.monitors = None
+    return sct
+
+
+def _get_monitors():
+    """
+    Return the cached monitor list for this thread.
+    mss caches its monitor list per instance, so a refresh recreates the handle.
+    """
+    monitors = getattr(_tls, 'monitors', None)
+    now = time.monotonic()
+    if monitors is not None and now - _tls.monitors_at < MONITOR_REFRESH_INTERVAL:
+        return monitors
+
+    if monitors is not None:
+        invalidate_monitors()
+
+    _tls.monitors = list(_get_sct().monitors)
+    _tls.monitors_at = now
+    _tls.mon_grid = _build_monitor_grid(_tls.monitors)
+    return _tls.monitors
+
+
+def _build_monitor_grid(monitors):
+    """
+    Rasterize each monitor rect into 256px cells: (x >> 8, y >> 8) -> monitor indices.
+    Cells on a monitor edge can overlap two monitors, so lookups still
+    bounds-check the (usually single) candidate.
+    """
+    grid = {}
+    for idx, m in enumerate(monitors[1:], 1):
+        x0 = m['left'] >> _GRID_SHIFT
+        y0 = m['top'] >> _GRID_SHIFT
+        x1 = (m['left'] + m['width'] - 1) >> _GRID_SHIFT
+        y1 = (m['top'] + m['height'] - 1) >> _GRID_SHIFT
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                grid.setdefault((cx, cy), []).append(idx)
+    return grid
+
+
+def _monitor_at(monitors, x, y) -> int:
+    """Return the index of the monitor containing (x, y), defaulting to primary."""
+    for idx in _tls.mon_grid.get((x >> _GRID_SHIFT, y >> _GRID_SHIFT), ()):
+        m = monitors[idx]
+        if (m['left'] <= x < m['left'] + m['width']) and \
+           (m['top'] <= y < m['top'] + m['height']):
+            return idx
+    return 1
+
+
+def invalidate_monitors():
+    """Drop the cached mss handle and monitor list (call on display change)."""
+    sct = getattr(_tls, 'sct', None)
+    _tls.sct = None
+    _tls.monitors = None
+    _tls.mon_grid = None
+    if sct is not None:
+        try:
+            sct.close()
+        except Exception as e:
+            logger.debug("Error closing mss handle: %s", e)
+
 
 def capture_screenshot(center_point=None):
     """
@@ -20,30 +121,27 @@ def capture_screenshot(center_point=None):
         center_point: Tuple (x, y) coordinates
     """
     try:
-        with mss.mss() as sct:
-            monitor_idx = 1 # Default to primary
-
-            if center_point:
-                x, y = center_point
-                logger.debug(f"Looking for monitor containing point ({x}, {y})")
-                # Find which monitor contains the point
-                # sct.monitors[0] is 'all monitors combined', so skip it
-                for i, m in enumerate(sct.monitors[1:], 1):
-                    if (m['left'] <= x < m['left'] + m['width']) and \
-                       (m['top'] <= y < m['top'] + m['height']):
-                        monitor_idx = i
-                        break
-
-            monitor = sct.monitors[monitor_idx]
-            screenshot = sct.grab(monitor)
-
-            # Convert to PIL Image
-            img = Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
-
-            logger.info(f"Screenshot captured (Monitor {monitor_idx}): {img.size}")
-            return img
+        monitors = _get_monitors()
+        sct = _get_sct()
+        monitor_idx = 1 # Default to primary
+
+        # Fast path: no point given, or only one physical monitor to choose from
+        if center_point and len(monitors) > 2:
+            x, y = center_point
+            logger.debug("Looking for monitor containing point (%s, %s)", x, y)
+            monitor_idx = _monitor_at(monitors, int(x), int(y))
+
+        monitor = monitors[monitor_idx]
+        screenshot = sct.grab(monitor)
+
+        # Convert to PIL Image
+        img = _shot_to_pil(screenshot)
+
+        logger.info("Screenshot captured (Monitor %s): %s", monitor_idx, img.size)
+        return img
     except Exception as e:
-        logger.error(f"Error capturing screenshot: {e}", exc_info=True)
+        logger.error("Error capturing screenshot: %s", e, exc_info=True)
+        invalidate_monitors()
         return None
 
 
@@ -61,14 +159,15 @@ def capture_region(x, y, width, height):
         PIL Image object
     """
     try:
-        with mss.mss() as sct:
-            monitor = {"top": y, "left": x, "width": width, "height": height}
-            screenshot = sct.grab(monitor)
+        sct = _get_sct()
+        monitor = {"top": y, "left": x, "width": width, "height": height}
+        screenshot = sct.grab(monitor)
 
-            img = Image.frombytes('RGB', screenshot.size, screenshot.bgra, 'raw', 'BGRX')
+        img = _shot_to_pil(screenshot)
 
-            logger.info(f"Region captured: {img.size}")
-            return img
+        logger.info("Region captured: %s", img.size)
+        return img
     except Exception as e:
-        logger.error(f"Error capturing region: {e}", exc_info=True)
+        logger.error("Error capturing region: %s", e, exc_info=True)
+        invalidate_monitors()
         return None
@@ -4,21 +4,39 @@ Configuration Management
 Handles loading/saving settings and API keys with encryption.
 """
 
-import json
+import atexit
 import logging
 import os
+import threading
+import time
+import weakref
 from pathlib import Path
-from typing import Dict, Any, Optional
-from cryptography.fernet import Fernet
+from typing import Dict, Any, Optional, Tuple
+from cryptography.fernet import Fernet, InvalidToken
 import base64
 from dotenv import load_dotenv
+from utils import fast_json
 
 logger = logging.getLogger(__name__)
 
+_DOTENV_LOADED = False  # .env files are parsed once per process, not per Settings()
+
+# Live Settings objects, flushed at exit; weak so atexit does not pin them
+_live_settings: "weakref.WeakSet" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    """Write pending changes of every Settings still alive at interpreter exit"""
+    for settings in list(_live_settings):
+        settings.flush()
+
 
 class Settings:
     """Application settings manager"""
 
+    SAVE_DELAY = 0.5  # seconds; coalesces bursts of set() calls into one write
+
     def __init__(self, config_file: str = "config.json"):
         self.config_file = config_file
         self.config_dir = Path.home() / ".privacy_llm_assistant"
@@ -27,16 +45,28 @@ class Settings:
         # Ensure config directory exists
         self.config_dir.mkdir(parents=True, exist_ok=True)
 
-        # Encryption key (stored separately)
+        # Encryption key (stored separately); loaded on first encrypt/decrypt
         self.key_file = self.config_dir / ".key"
-        self._cipher = self._get_cipher()
+        self._cipher: Optional[Fernet] = None
 
         # Load settings
         self.settings = self._load_settings()
 
+        # Deferred-save state: set() marks dirty and schedules one coalesced write.
+        # _save_lock also guards self.settings, which the timer thread serializes
+        self._dirty = False
+        self._version = 0  # bumped per change, so a save only clears what it wrote
+        self._save_deadline: Optional[float] = None  # monotonic time of the pending write
+        self._save_thread: Optional[threading.Thread] = None  # alive only while a write is pending
+        self._save_lock = threading.Lock()
+        _live_settings.add(self)
+
         # Load environment variables with override=True to prevent stale IDE caching
-        load_dotenv(self.config_dir / ".env", override=True)
-        load_dotenv(override=True)
+        global _DOTENV_LOADED
+        if not _DOTENV_LOADED:
+            load_dotenv(self.config_dir / ".env", override=True)
+            load_dotenv(override=True)
+            _DOTENV_LOADED = True
 
         # Override Settings with Environment Variables
         env_model = os.getenv("GEMINI_MODEL")
@@ -44,18 +74,47 @@ class Settings:
             if "llm" not in self.settings:
                 self.settings["llm"] = {}
             self.settings["llm"]["gemini_model"] = env_model
-            logger.debug(f"GEMINI_MODEL override from env: {env_model}")
+            logger.debug("GEMINI_MODEL override from env: %s", env_model)
+
+        # Flat "a.b.c" -> value index so get() is a single dict lookup
+        self._flat: Dict[str, Any] = {}
+        self._rebuild_index()
+
+    @property
+    def cipher(self) -> Fernet:
+        """Encryption cipher, created lazily so env-var-only setups skip key IO"""
+        if self._cipher is None:
+            self._cipher = self._get_cipher()
+        return self._cipher
+
+    def _rebuild_index(self):
+        """Rebuild the flat dotted-path index from the nested settings dict"""
+        flat: Dict[str, Any] = {}
+        stack = [("", self.settings)]
+        while stack:
+            prefix, node = stack.pop()
+            for key, value in node.items():
+                path = f"{prefix}{key}"
+                flat[path] = value
+                if isinstance(value, dict):
+                    stack.append((f"{path}.", value))
+        self._flat = flat
 
     def _get_cipher(self) -> Fernet:
         """Get or create encryption cipher"""
         if self.key_file.exists():
-            with open(self.key_file, 'rb') as f:
-                key = f.read()
+            key = self.key_file.read_bytes()
         else:
-            # Generate new key
+            # Generate new key, created owner-read/write only so other users can't read it
             key = Fernet.generate_key()
-            with open(self.key_file, 'wb') as f:
+            flags = (
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0)
+            )
+            fd = os.open(self.key_file, flags, 0o600)
+            with os.fdopen(fd, 'wb') as f:
                 f.write(key)
+            os.chmod(self.key_file, 0o600)  # in case the file pre-existed with wider mode
             logger.info("Generated new encryption key")
 
         return Fernet(key)
@@ -67,11 +126,11 @@ class Settings:
             return self._get_default_settings()
 
         try:
-            with open(self.config_path, 'r') as f:
-                logger.debug(f"Loaded config from {self.config_path}")
-                return json.load(f)
+            settings = fast_json.loads(self.config_path.read_bytes())
+            logger.debug("Loaded config from %s", self.config_path)
+            return settings
         except Exception as e:
-            logger.error(f"Error loading config: {e}", exc_info=True)
+            logger.error("Error loading config: %s", e, exc_info=True)
             return self._get_default_settings()
 
     def _get_default_settings(self) -> Dict[str, Any]:
@@ -82,13 +141,18 @@ class Settings:
                 "gemini_api_key_encrypted": None,
                 "claude_api_key_encrypted": None,
                 "gemini_model": "gemini-3.1-flash-lite-preview",
-                "claude_model": "claude-3-5-sonnet-20241022"
+                "claude_model": "claude-3-5-sonnet-20241022",
+                "max_image_edge": 1568  # longest image edge sent to the LLM; 0 disables
             },
             "ui": {
                 "theme": "dark",
                 "window_position": None,
                 "window_size": [1400, 900],
-                "sidebar_width": 250
+                "sidebar_width": 250,
+                # Streaming shows text sooner but costs a classify call before a
+                # separate streamed solve; off, the smart provider answers with
+                # one fused classify+solve call (fewer round trips overall)
+                "stream_responses": False
             },
             "shortcuts": {
                 "screenshot": "Ctrl+H",
@@ -101,50 +165,120 @@ class Settings:
         }
 
     def save(self):
-        """Save settings to file"""
+        """
+        Save settings to file. The snapshot is serialized under _save_lock so
+        a concurrent set() cannot mutate the dict mid-dump; pending changes
+        stay dirty unless the write succeeds.
+        """
+        with self._save_lock:
+            self._save_deadline = None  # a sleeping saver exits without writing
+            version = self._version
+            try:
+                data = fast_json.dumps_bytes(self.settings, indent=True)
+            except Exception as e:
+                logger.error("Error serializing config: %s", e, exc_info=True)
+                return
         try:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.settings, f, indent=2)
-            logger.info(f"Settings saved to {self.config_path}")
+            self.config_path.write_bytes(data)
         except Exception as e:
-            logger.error(f"Error saving config: {e}", exc_info=True)
+            logger.error("Error saving config: %s", e, exc_info=True)
+            return
+        with self._save_lock:
+            # A set() after the snapshot keeps its own pending save
+            if self._version == version:
+                self._dirty = False
+        logger.info("Settings saved to %s", self.config_path)
+
+    def flush(self):
+        """Write pending changes from set() immediately, if any"""
+        with self._save_lock:
+            dirty = self._dirty
+        if dirty:
+            self.save()
+
+    def _schedule_save(self):
+        """Mark settings dirty and push back the coalesced write by SAVE_DELAY"""
+        with self._save_lock:
+            self._dirty = True
+            self._version += 1
+            # Later calls only push the deadline back; one saver thread per burst
+            self._save_deadline = time.monotonic() + self.SAVE_DELAY
+            if self._save_thread is None:
+                self._save_thread = threading.Thread(
+                    target=self._save_when_quiet, name="settings-save", daemon=True
+                )
+                self._save_thread.start()
+
+    def _save_when_quiet(self):
+        """Saver thread: sleep until SAVE_DELAY passes without a set(), write once, exit"""
+        while True:
+            with self._save_lock:
+                deadline = self._save_deadline
+                remaining = 0.0 if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    self._save_deadline = None
+                    self._save_thread = None
+            if remaining > 0:
+                time.sleep(remaining)
+            elif deadline is None:
+                return  # save() already ran
+            else:
+                self.flush()
+                return
 
     def encrypt_value(self, value: str) -> str:
-        """Encrypt a sensitive value"""
-        encrypted = self._cipher.encrypt(value.encode())
-        return base64.b64encode(encrypted).decode()
+        """Encrypt a sensitive value (Fernet tokens are already URL-safe base64)"""
+        return self.cipher.encrypt(value.encode()).decode('ascii')
 
     def decrypt_value(self, encrypted_value: str) -> Optional[str]:
         """Decrypt a sensitive value"""
+        return self._decrypt(encrypted_value)[0]
+
+    def _decrypt(self, encrypted_value: str) -> Tuple[Optional[str], bool]:
+        """
+        Decrypt a value, returning (plaintext, is_legacy).
+        Older configs wrapped the Fernet token in a second base64 layer.
+        """
+        try:
+            return self.cipher.decrypt(encrypted_value.encode('ascii')).decode(), False
+        except (InvalidToken, ValueError):
+            pass
+
         try:
-            encrypted_bytes = base64.b64decode(encrypted_value.encode())
-            decrypted = self._cipher.decrypt(encrypted_bytes)
-            return decrypted.decode()
+            encrypted_bytes = base64.b64decode(encrypted_value.encode('ascii'))
+            return self.cipher.decrypt(encrypted_bytes).decode(), True
         except Exception as e:
-            logger.error(f"Decryption error: {e}")
-            return None  # Return None instead of a string so fallback logic works
+            logger.error("Decryption error: %s", e)
+            return None, False  # Return None instead of a string so fallback logic works
 
     def set_api_key(self, provider: str, api_key: str):
-        """Set and encrypt an API key"""
+        """Set and encrypt an API key (saved immediately, never deferred)"""
         encrypted = self.encrypt_value(api_key)
-        self.settings["llm"][f"{provider}_api_key_encrypted"] = encrypted
+        with self._save_lock:
+            self.settings["llm"][f"{provider}_api_key_encrypted"] = encrypted
+            self._rebuild_index()
+            self._version += 1
+            self._dirty = True
         self.save()
-        logger.info(f"API key stored for {provider}")
+        logger.info("API key stored for %s", provider)
 
     def get_api_key(self, provider: str) -> Optional[str]:
         """Get an API key (prioritizing Environment Variables over config)"""
         # 1. Try Environment Variable first (allows .env to override broken configs)
         env_key = os.getenv(f"{provider.upper()}_API_KEY")
         if env_key:
-            logger.debug(f"Using {provider} API key from environment variable")
+            logger.debug("Using %s API key from environment variable", provider)
             return env_key
 
         # 2. Try encrypted key
         encrypted = self.settings["llm"].get(f"{provider}_api_key_encrypted")
         if encrypted:
-            decrypted = self.decrypt_value(encrypted)
+            decrypted, is_legacy = self._decrypt(encrypted)
             if decrypted:
-                logger.debug(f"Using {provider} API key from encrypted config")
+                if is_legacy:
+                    logger.info("Migrating %s API key to current encryption format", provider)
+                    self.set_api_key(provider, decrypted)
+                logger.debug("Using %s API key from encrypted config", provider)
                 return decrypted
 
         # 3. Try plain text key (for manual config)
@@ -153,7 +287,17 @@ class Settings:
     def get(self, key_path: str, default=None) -> Any:
         """
         Get a setting value using dot notation.
+        Served from the flat index; code that edits self.settings directly
+        instead of through set() must call _rebuild_index() afterwards, or
+        existing keys keep returning their old values.
         """
+        try:
+            return self._flat[key_path]
+        except KeyError:
+            pass
+
+        # Slow path: walk the nested dict. Only reached for paths missing from
+        # the index (e.g. keys added by a direct edit), never for stale values
         keys = key_path.split('.')
         value = self.settings
 
@@ -167,14 +311,18 @@ class Settings:
     def set(self, key_path: str, value: Any):
         """
         Set a setting value using dot notation.
+        The write to disk is deferred by SAVE_DELAY; call flush() to force it.
         """
         keys = key_path.split('.')
-        target = self.settings
 
-        for key in keys[:-1]:
-            if key not in target:
-                target[key] = {}
-            target = target[key]
+        # Under the save lock, so the timer thread never dumps a half-edited dict
+        with self._save_lock:
+            target = self.settings
+            for key in keys[:-1]:
+                if key not in target:
+                    target[key] = {}
+                target = target[key]
 
-        target[keys[-1]] = value
-        self.save()
\ No newline at end of file
+            target[keys[-1]] = value
+            self._rebuild_index()
+        self._schedule_save()
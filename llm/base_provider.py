@@ -4,20 +4,67 @@ Base LLM Provider
 Abstract base class defining the interface for all LLM providers.
 """
 
+import io
 import json
 import logging
+import os
+import re
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Generator, Callable, TypeVar
 from PIL import Image
+from utils import fast_json
 
 logger = logging.getLogger(__name__)
 
+# Longest image edge sent to providers; Claude downscales anything larger server-side
+DEFAULT_MAX_IMAGE_EDGE = 1568
+
+# PIL releases the GIL while encoding, so multi-image requests encode in parallel
+_ENCODE_POOL = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1),
+    thread_name_prefix="image-encode",
+)
+
+_T = TypeVar("_T")
+
+_scratch = threading.local()
+
+
+def _scratch_buffer() -> io.BytesIO:
+    """
+    Return this thread's reusable encode buffer, rewound and emptied.
+    Callers must release any getbuffer() views before the next call.
+    """
+    buffer = getattr(_scratch, 'buffer', None)
+    if buffer is None:
+        buffer = io.BytesIO()
+        _scratch.buffer = buffer
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+# Opening ```json (or bare ```) fence directly followed by a JSON object/array.
+# The block is taken up to the last fence, since string values in the JSON
+# (e.g. generated code) may themselves contain ``` and closing braces
+_JSON_FENCE_OPEN = re.compile(r"```(?:json)?\s*(?=[\[{])")
+
 class BaseLLMProvider(ABC):
     """Abstract base class for LLM providers"""
+
+    PNG_MAX_EDGE = 512  # images this small (or with real alpha) stay PNG
     
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        max_image_edge: Optional[int] = DEFAULT_MAX_IMAGE_EDGE,
+        jpeg_quality: int = 85
+    ):
         self.api_key = api_key
         self._model_name = None
+        self.max_image_edge = max_image_edge  # None/0 disables downscaling
+        self.jpeg_quality = jpeg_quality
     
     @abstractmethod
     def send_message(
@@ -45,6 +92,51 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    def _prepare_image(self, image: Image.Image) -> Image.Image:
+        """
+        Downscale an image so its longest edge fits max_image_edge.
+        Returns the original image untouched when it is already small enough.
+        BILINEAR is several times faster than LANCZOS at no visible cost for
+        screenshots; installing Pillow-SIMD in place of Pillow speeds it up further.
+        """
+        edge = self.max_image_edge
+        if edge and max(image.size) > edge:
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.Resampling.BILINEAR)
+        return image
+
+    def _write_image(self, image: Image.Image, buffer) -> str:
+        """
+        Encode an image into buffer and return its MIME type.
+        Large opaque images are written as JPEG (far smaller and faster to
+        encode than PNG); small images or ones with real transparency stay PNG.
+        """
+        if self._use_jpeg(image):
+            rgb = image if image.mode == 'RGB' else image.convert('RGB')
+            # optimize=True roughly doubles encode time for a few % of bytes
+            rgb.save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=False, subsampling=2)
+            return "image/jpeg"
+        image.save(buffer, format='PNG')
+        return "image/png"
+
+    def _use_jpeg(self, image: Image.Image) -> bool:
+        """JPEG for large images without meaningful alpha; PNG otherwise."""
+        if max(image.size) <= self.PNG_MAX_EDGE:
+            return False
+        if image.mode in ('RGB', 'L'):
+            return True
+        if image.mode == 'RGBA':
+            # Screenshots are RGBA with a fully opaque alpha channel
+            return image.getchannel('A').getextrema()[0] == 255
+        return False
+
+    @staticmethod
+    def _map_images(fn: Callable[[Image.Image], _T], images: List[Image.Image]) -> List[_T]:
+        """Apply an encode function to each image, in parallel when there are several."""
+        if len(images) == 1:
+            return [fn(images[0])]
+        return list(_ENCODE_POOL.map(fn, images))
+
     def parse_structured_output(self, response_text: str) -> Dict[str, Any]:
         """
         Parse structured JSON output from LLM response reliably.
@@ -55,16 +147,16 @@ class BaseLLMProvider(ABC):
 
         try:
             # Try to extract JSON from markdown code blocks
-            if "```json" in response_text:
-                start = response_text.find("```json") + 7
-                end = response_text.rfind("```")
-                json_str = response_text[start:end].strip()
-                return json.loads(json_str)
+            match = _JSON_FENCE_OPEN.search(response_text)
+            if match:
+                start = match.end()
+                end = response_text.rfind("```", start)
+                return fast_json.loads(response_text[start:end if end != -1 else None].strip())
             
             # Fallback to direct JSON parsing
-            return json.loads(response_text)
+            return fast_json.loads(response_text)
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON: {e} | Raw text preview: {response_text[:150]}...")
+            logger.error("Failed to parse JSON: %s | Raw text preview: %s...", e, response_text[:150])
             return {"raw": response_text, "error": f"JSON Parsing Error: {str(e)}"}
     
     @property
@@ -5,25 +5,72 @@ Integration with Anthropic's Claude API (3.5 Sonnet)
 Supports multi-modal inputs and structured outputs.
 """
 
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Generator
 from PIL import Image
 import anthropic
-from llm.base_provider import BaseLLMProvider
+from llm.base_provider import BaseLLMProvider, DEFAULT_MAX_IMAGE_EDGE, _scratch_buffer
+from utils import fast_json
 
 import base64
-import io
 
 logger = logging.getLogger(__name__)
 
 
+SCHEMA_CACHE_SIZE = 64
+
+# id(schema) -> (schema, prompt suffix); holding the schema keeps its id from being reused
+_schema_instructions: "OrderedDict[int, tuple]" = OrderedDict()
+_schema_lock = threading.Lock()
+
+
+def _schema_instruction(json_schema: Dict[str, Any]) -> str:
+    """
+    Prompt suffix asking for JSON matching `json_schema`, serialized once per
+    schema object. Callers pass module-level schemas, so lookups are by
+    identity and skip the dump; schemas are treated as immutable.
+    """
+    key = id(json_schema)
+    with _schema_lock:
+        cached = _schema_instructions.get(key)
+        if cached is not None:
+            _schema_instructions.move_to_end(key)
+            return cached[1]
+
+    # Real JSON, not the dict's Python repr
+    instruction = (
+        "\n\nRespond ONLY with valid JSON matching this schema:\n"
+        f"```json\n{fast_json.dumps(json_schema)}\n```"
+    )
+    with _schema_lock:
+        _schema_instructions[key] = (json_schema, instruction)
+        while len(_schema_instructions) > SCHEMA_CACHE_SIZE:
+            _schema_instructions.popitem(last=False)
+    return instruction
+
+
 class ClaudeProvider(BaseLLMProvider):
     """Anthropic Claude API provider"""
 
-    def __init__(self, api_key: str, model_name: str = "claude-3-5-sonnet-20241022"):
-        super().__init__(api_key)
+    ENCODE_CACHE_SIZE = 8  # encoded images kept for send/stream/retry reuse
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "claude-3-5-sonnet-20241022",
+        jpeg_quality: int = 85,
+        max_image_edge: Optional[int] = DEFAULT_MAX_IMAGE_EDGE
+    ):
+        super().__init__(api_key, max_image_edge, jpeg_quality)
         self._model_name = model_name
 
+        # (mode, size, pixel digest) -> (base64, media_type)
+        self._encode_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._encode_lock = threading.Lock()
+
         if not api_key or not api_key.strip():
             logger.error("Claude API key is empty or None")
             raise ValueError("Claude API key is empty or None.")
@@ -31,83 +78,121 @@ class ClaudeProvider(BaseLLMProvider):
         # Initialize Claude client
         try:
             self.client = anthropic.Anthropic(api_key=api_key)
-            logger.info(f"Claude provider initialized: {model_name}")
+            logger.info("Claude provider initialized: %s", model_name)
         except Exception as e:
-            logger.critical(f"Failed to initialize Claude client: {e}")
+            logger.critical("Failed to initialize Claude client: %s", e)
             raise
 
+    @staticmethod
+    def _image_key(image: Image.Image) -> tuple:
+        """Encode-cache key: mode, size and a digest of the pixels (and palette)."""
+        digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+        if image.mode in ("P", "PA"):
+            digest.update(bytes(image.getpalette() or ()))
+        return image.mode, image.size, digest.digest()
+
     def _image_to_base64(self, image: Image.Image) -> tuple[str, str]:
-        """Convert PIL Image to base64 string"""
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        img_bytes = buffer.getvalue()
-        img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-        return img_base64, "image/png"
+        """
+        Convert PIL Image to base64 string (JPEG or PNG, see _write_image).
+        Results are cached by a digest of the pixels, so an image edited in
+        place is re-encoded; hashing costs a fraction of the encode it skips.
+        """
+        key = self._image_key(image)
+        with self._encode_lock:
+            cached = self._encode_cache.get(key)
+            if cached:
+                self._encode_cache.move_to_end(key)
+                return cached
 
-    def send_message(
+        image = self._prepare_image(image)
+
+        buffer = _scratch_buffer()
+        media_type = self._write_image(image, buffer)
+
+        # Encode straight from the buffer's memory; getvalue() would copy it first
+        with buffer.getbuffer() as view:
+            img_base64 = base64.b64encode(view).decode('ascii')
+
+        with self._encode_lock:
+            self._encode_cache[key] = (img_base64, media_type)
+            while len(self._encode_cache) > self.ENCODE_CACHE_SIZE:
+                self._encode_cache.popitem(last=False)
+
+        return img_base64, media_type
+
+    def _build_request(
         self,
         text: str,
         images: Optional[List[Image.Image]] = None,
         audio_file: Optional[str] = None,
         system_prompt: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Send message to Claude"""
-        try:
-            # Build message content
-            content = []
-
-            # Add images first (Claude convention)
-            if images:
-                logger.debug(f"Attaching {len(images)} image(s) to Claude request")
-                for img in images:
-                    img_base64, media_type = self._image_to_base64(img)
-                    content.append({
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": img_base64
-                        }
-                    })
-
-            # Add text
-            if text:
-                content.append({
-                    "type": "text",
-                    "text": text
-                })
+        """Build the messages.create/stream params shared by send and stream."""
+        content = []
 
-            # Note: Claude API doesn't support audio directly yet
-            # We would need to transcribe first or use a different approach
-            if audio_file:
-                logger.warning(f"Audio file '{audio_file}' provided but Claude does not support native audio")
+        # Add images first (Claude convention)
+        if images:
+            logger.debug("Attaching %s image(s) to Claude request", len(images))
+            for img_base64, media_type in self._map_images(self._image_to_base64, images):
                 content.append({
-                    "type": "text",
-                    "text": f"\n[Audio file provided: {audio_file}. Please note: audio processing requires transcription first.]"
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": media_type,
+                        "data": img_base64
+                    }
                 })
 
-            # Create message
-            message_params = {
-                "model": self._model_name,
-                "max_tokens": 4096,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
-            }
+        # Add text
+        if text:
+            content.append({
+                "type": "text",
+                "text": text
+            })
+
+        # Note: Claude API doesn't support audio directly yet
+        # We would need to transcribe first or use a different approach
+        if audio_file:
+            logger.warning("Audio file '%s' provided but Claude does not support native audio", audio_file)
+            content.append({
+                "type": "text",
+                "text": f"\n[Audio file provided: {audio_file}. Please note: audio processing requires transcription first.]"
+            })
+
+        message_params = {
+            "model": self._model_name,
+            "max_tokens": 4096,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
+        }
+
+        # Add system prompt if provided
+        if system_prompt:
+            message_params["system"] = system_prompt
 
-            # Add system prompt if provided
-            if system_prompt:
-                message_params["system"] = system_prompt
+        return message_params
+
+    def send_message(
+        self,
+        text: str,
+        images: Optional[List[Image.Image]] = None,
+        audio_file: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Send message to Claude"""
+        try:
+            message_params = self._build_request(text, images, audio_file, system_prompt)
 
-            logger.info(f"Sending request to Claude ({self._model_name})...")
+            logger.info("Sending request to Claude (%s)...", self._model_name)
             response = self.client.messages.create(**message_params)
 
             logger.info(
-                f"Claude response received — stop_reason: {response.stop_reason}, "
-                f"tokens: {response.usage.input_tokens}in/{response.usage.output_tokens}out"
+                "Claude response received — stop_reason: %s, tokens: %sin/%sout",
+                response.stop_reason, response.usage.input_tokens, response.usage.output_tokens
             )
 
             return {
@@ -122,19 +207,19 @@ class ClaudeProvider(BaseLLMProvider):
                 }
             }
         except anthropic.AuthenticationError as e:
-            logger.error(f"Claude authentication failed — check your API key: {e}")
+            logger.error("Claude authentication failed — check your API key: %s", e)
             return {
                 'response': "Authentication failed. Please check your Claude API key.",
                 'metadata': {'error': str(e)}
             }
         except anthropic.RateLimitError as e:
-            logger.warning(f"Claude rate limit hit: {e}")
+            logger.warning("Claude rate limit hit: %s", e)
             return {
                 'response': "Rate limit reached. Please wait a moment and try again.",
                 'metadata': {'error': str(e)}
             }
         except Exception as e:
-            logger.exception(f"Claude API error: {e}")
+            logger.exception("Claude API error: %s", e)
             return {
                 'response': f"Error: {str(e)}",
                 'metadata': {'error': str(e)}
@@ -149,40 +234,7 @@ class ClaudeProvider(BaseLLMProvider):
     ) -> Generator[str, Any, None]:
         """Stream response from Claude"""
         try:
-            # Build message content
-            content = []
-
-            if images:
-                for img in images:
-                    img_base64, media_type = self._image_to_base64(img)
-                    content.append({
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": img_base64
-                        }
-                    })
-
-            if text:
-                content.append({
-                    "type": "text",
-                    "text": text
-                })
-
-            message_params = {
-                "model": self._model_name,
-                "max_tokens": 4096,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
-            }
-
-            if system_prompt:
-                message_params["system"] = system_prompt
+            message_params = self._build_request(text, images, audio_file, system_prompt)
 
             # Stream response
             logger.info("Initiating Claude stream...")
@@ -190,7 +242,7 @@ class ClaudeProvider(BaseLLMProvider):
                 for text_chunk in stream.text_stream:
                     yield text_chunk
         except Exception as e:
-            logger.exception(f"Claude streaming error: {e}")
+            logger.exception("Claude streaming error: %s", e)
             yield f"\n\nError: {str(e)}"
 
     def send_with_json_output(
@@ -204,7 +256,7 @@ class ClaudeProvider(BaseLLMProvider):
         """
         try:
             # Add schema instruction to prompt
-            schema_prompt = f"{text}\n\nRespond ONLY with valid JSON matching this schema:\n```json\n{json_schema}\n```"
+            schema_prompt = text + _schema_instruction(json_schema)
 
             logger.debug("Sending structured JSON request to Claude")
             response = self.send_message(schema_prompt, images=images)
@@ -212,5 +264,5 @@ class ClaudeProvider(BaseLLMProvider):
             # Parse JSON from response
             return self.parse_structured_output(response['response'])
         except Exception as e:
-            logger.exception(f"Claude JSON output error: {e}")
+            logger.exception("Claude JSON output error: %s", e)
             return {'error': str(e)}
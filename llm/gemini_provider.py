@@ -5,12 +5,16 @@ Integration with Google's Gemini API (2.0 Flash)
 Supports multi-modal inputs and structured outputs.
 """
 
+import json
 import logging
+import os
+import time
 from typing import List, Dict, Any, Optional, Generator
 from PIL import Image
 from google import genai
 from google.genai import types
-from llm.base_provider import BaseLLMProvider
+from llm.base_provider import BaseLLMProvider, DEFAULT_MAX_IMAGE_EDGE, _scratch_buffer
+from utils import fast_json
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +22,17 @@ logger = logging.getLogger(__name__)
 class GeminiProvider(BaseLLMProvider):
     """Google Gemini API provider"""
 
-    def __init__(self, api_key: str, model_name: str = "gemini-3.1-flash-lite-preview"):
-        super().__init__(api_key)
+    # Gemini deletes uploaded files after 48h; expire cache entries a bit earlier
+    UPLOAD_TTL_S = 47 * 3600
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-3.1-flash-lite-preview",
+        max_image_edge: Optional[int] = DEFAULT_MAX_IMAGE_EDGE,
+        jpeg_quality: int = 85
+    ):
+        super().__init__(api_key, max_image_edge, jpeg_quality)
         self._model_name = model_name
 
         # Strict validation to catch empty keys before hitting the API
@@ -30,11 +43,58 @@ class GeminiProvider(BaseLLMProvider):
         # Configure new Gemini Client
         try:
             self.client = genai.Client(api_key=api_key)
-            logger.info(f"Gemini provider initialized successfully with model: {model_name}")
+            logger.info("Gemini provider initialized successfully with model: %s", model_name)
         except Exception as e:
-            logger.critical(f"Failed to initialize Gemini Client: {e}")
+            logger.critical("Failed to initialize Gemini Client: %s", e)
             raise
 
+        # "path:mtime:size" -> (uploaded_at, File); files belong to this client's API key
+        self._upload_cache: Dict[str, tuple] = {}
+
+        # system_prompt -> GenerateContentConfig, built once per distinct prompt
+        self._configs: Dict[str, types.GenerateContentConfig] = {}
+
+    def _config_for(self, system_prompt: Optional[str]) -> Optional[types.GenerateContentConfig]:
+        """Return the (cached) request config carrying system_prompt as system_instruction."""
+        if not system_prompt:
+            return None
+        config = self._configs.get(system_prompt)
+        if config is None:
+            config = types.GenerateContentConfig(system_instruction=system_prompt)
+            self._configs[system_prompt] = config
+        return config
+
+    def _upload_audio(self, audio_file: str):
+        """Upload an audio file, reusing a previous upload of the same unchanged file."""
+        key = f"{os.path.abspath(audio_file)}:{os.path.getmtime(audio_file)}:{os.path.getsize(audio_file)}"
+        cached = self._upload_cache.get(key)
+        if cached and time.time() - cached[0] < self.UPLOAD_TTL_S:
+            logger.debug("Reusing uploaded audio file: %s", audio_file)
+            return cached[1]
+
+        logger.info("Uploading audio file: %s", audio_file)
+        uploaded = self.client.files.upload(file=audio_file)
+        self._upload_cache[key] = (time.time(), uploaded)
+        return uploaded
+
+    def _image_to_part(self, image: Image.Image) -> types.Part:
+        """
+        Encode a PIL image ourselves (JPEG for large opaque images) so the SDK
+        uploads compact bytes instead of re-encoding the image as PNG.
+        Parts that were already encoded are passed through unchanged.
+        """
+        if isinstance(image, types.Part):
+            return image
+        image = self._prepare_image(image)
+        buffer = _scratch_buffer()
+        mime_type = self._write_image(image, buffer)
+        # The part must own its bytes since the buffer is reused by the next encode
+        return types.Part.from_bytes(data=buffer.getvalue(), mime_type=mime_type)
+
+    def _image_parts(self, images: List[Image.Image]) -> List[types.Part]:
+        """Encode all images into request parts (in parallel for several)."""
+        return self._map_images(self._image_to_part, images)
+
     def send_message(
         self,
         text: str,
@@ -50,19 +110,15 @@ class GeminiProvider(BaseLLMProvider):
                 parts.append(text)
 
             if images:
-                logger.debug(f"Attaching {len(images)} image(s) to Gemini request")
-                parts.extend(images)
+                logger.debug("Attaching %s image(s) to Gemini request", len(images))
+                parts.extend(self._image_parts(images))
 
             if audio_file:
-                logger.info(f"Uploading audio file: {audio_file}")
-                audio_part = self.client.files.upload(file=audio_file)
-                parts.append(audio_part)
+                parts.append(self._upload_audio(audio_file))
 
-            config = types.GenerateContentConfig(
-                system_instruction=system_prompt
-            ) if system_prompt else None
+            config = self._config_for(system_prompt)
 
-            logger.info(f"Sending message to Gemini API ({self._model_name}, {len(parts)} part(s))...")
+            logger.info("Sending message to Gemini API (%s, %s part(s))...", self._model_name, len(parts))
             response = self.client.models.generate_content(
                 model=self._model_name,
                 contents=parts,
@@ -73,7 +129,7 @@ class GeminiProvider(BaseLLMProvider):
             if response.candidates and response.candidates[0].finish_reason:
                 finish_reason = response.candidates[0].finish_reason.name
 
-            logger.info(f"Gemini response received — finish_reason: {finish_reason}")
+            logger.info("Gemini response received — finish_reason: %s", finish_reason)
 
             return {
                 'response': response.text or "",
@@ -84,7 +140,7 @@ class GeminiProvider(BaseLLMProvider):
             }
         except Exception as e:
             error_type = type(e).__name__
-            logger.exception(f"Gemini API Error ({error_type}): {e}")
+            logger.exception("Gemini API Error (%s): %s", error_type, e)
 
             # Provide user-friendly messages for common errors
             user_msg = f"Error connecting to Gemini: {str(e)}"
@@ -115,15 +171,12 @@ class GeminiProvider(BaseLLMProvider):
                 parts.append(text)
 
             if images:
-                parts.extend(images)
+                parts.extend(self._image_parts(images))
 
             if audio_file:
-                audio_part = self.client.files.upload(file=audio_file)
-                parts.append(audio_part)
+                parts.append(self._upload_audio(audio_file))
 
-            config = types.GenerateContentConfig(
-                system_instruction=system_prompt
-            ) if system_prompt else None
+            config = self._config_for(system_prompt)
 
             logger.info("Initiating Gemini stream...")
             response = self.client.models.generate_content_stream(
@@ -136,32 +189,42 @@ class GeminiProvider(BaseLLMProvider):
                 if chunk.text:
                     yield chunk.text
         except Exception as e:
-            logger.exception(f"Gemini API Error in stream_response: {e}")
+            logger.exception("Gemini API Error in stream_response: %s", e)
             yield f"\n\nError connecting to Gemini: {str(e)}"
 
     def send_with_json_output(
         self,
         text: str,
         json_schema: Dict[str, Any],
-        images: Optional[List[Image.Image]] = None
+        images: Optional[List[Image.Image]] = None,
+        max_output_tokens: Optional[int] = None,
+        system_instruction: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Send message and request JSON output matching schema natively.
+        The model decodes against the schema server-side, so the reply is
+        parsed directly; fence stripping is only a fallback.
+        A static system_instruction is sent as the request's system
+        instruction, apart from the per-call text.
         """
         try:
             parts: List[Any] = [text]
 
             if images:
-                parts.extend(images)
+                parts.extend(self._image_parts(images))
 
             config = types.GenerateContentConfig(
+                system_instruction=system_instruction,
                 response_mime_type="application/json",
                 response_schema=json_schema,
-                temperature=0.1  # Low temperature to force strict structure adherence
+                temperature=0.1,  # Low temperature to force strict structure adherence
+                candidate_count=1,
+                max_output_tokens=max_output_tokens,
             )
 
             logger.info("Sending JSON structured request to Gemini...")
-            logger.debug(f"Schema keys: {list(json_schema.get('properties', {}).keys())}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Schema keys: %s", list(json_schema.get('properties', {}).keys()))
             response = self.client.models.generate_content(
                 model=self._model_name,
                 contents=parts,
@@ -169,8 +232,11 @@ class GeminiProvider(BaseLLMProvider):
             )
 
             raw_text = response.text or ""
-            logger.debug(f"JSON response length: {len(raw_text)} chars")
-            return self.parse_structured_output(raw_text)
+            logger.debug("JSON response length: %s chars", len(raw_text))
+            try:
+                return fast_json.loads(raw_text)
+            except json.JSONDecodeError:
+                return self.parse_structured_output(raw_text)
         except Exception as e:
-            logger.exception(f"Gemini JSON output error: {e}")
+            logger.exception("Gemini JSON output error: %s", e)
             return {'error': str(e)}
\ No newline at end of file
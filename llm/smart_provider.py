@@ -1,18 +1,26 @@
 """
 Smart Gemini Provider
 
-Implements a multi-step reasoning process:
-1. Classification & Extraction (using Vision)
-2. Solution Generation (using structured context)
+Classifies and solves in one fused structured call, falling back to a
+multi-step reasoning process:
+1. Classification & Extraction (using Vision), overlapped with a
+   speculative non-coding solution request
+2. Solution Generation (using structured context) when the speculation
+   does not apply
 Uses TOON format for efficient context representation.
 """
 
+import asyncio
+import functools
 import json
 import re
 import time
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable
 from PIL import Image
+from google.genai import types
+from .base_provider import DEFAULT_MAX_IMAGE_EDGE
 from .gemini_provider import GeminiProvider
 from .exceptions import LLMExtractionError, LLMGenerationError, LLMFormattingError
 
@@ -27,16 +35,304 @@ try:
     )
 except ImportError:
     logger.warning("toon_formatter missing, falling back to JSON.")
-    def encode_toon(data): return json.dumps(data, indent=2)
-    def encode_problem_context(problem_info, problem_type): return json.dumps(problem_info, indent=2)
+    def encode_toon(data): return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+    def encode_problem_context(problem_info, problem_type): return encode_toon(problem_info)
     def encode_extraction_hints(user_prompt): return user_prompt
     def is_toon_available() -> bool: return False
 
 
+# Batch Mode: jobs are not realtime, so callers get a generous default wait
+BATCH_TIMEOUT_S = 15 * 60
+BATCH_FALLBACK_WORKERS = 8
+_BATCH_DONE_STATES = frozenset({
+    "JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED",
+})
+
+# Extracted detail fields above this size are sent once as labeled prompt
+# sections instead of inside the TOON context (field -> marker left behind)
+HEAVY_FIELD_CHARS = 2048
+_HEAVY_DETAIL_FIELDS = {
+    "code_snippet": "<code: see CODE section>",
+    "problem_statement": "<problem: see PROBLEM STATEMENT section>",
+}
+
+# Step-list cleanup: numbered markers ("1. ", "2) ", "Step 3:") and bullets
+_STEP_MARKER = re.compile(r'(?:^|\s)(?:\d+[\.\)]\s+|Step\s+\d+[:\s])')
+_LEADING_BULLET = re.compile(r'^[\-\*•]\s*')
+# Markdown fence wrapped around generated code
+_CODE_FENCE_OPEN = re.compile(r'^```\w*\n?')
+_CODE_FENCE_CLOSE = re.compile(r'\n?```$')
+
+# Static instructions, sent as system instructions; only the TOON context
+# varies per call
+_CLASSIFY_INSTRUCTION = """\
+You are an expert analyst. Analyze the provided image(s) carefully.
+
+STEP 1: CLASSIFY THE PROBLEM TYPE
+Determine exactly ONE of: coding, multiple_choice, math, general
+
+STEP 2: EXTRACT KEY DATA
+- problem_summary: 1-2 sentence brief summary
+- details: key entities (language, options, variables, constraints, etc.)
+
+Return a valid JSON object. Do NOT transcribe the entire image text."""
+
+_FUSED_INSTRUCTION = """\
+You are an expert analyst, tutor and Senior Software Engineer. Analyze the provided image(s) carefully.
+
+TASK:
+1. problem_info: classify the problem as exactly ONE of coding, multiple_choice, math, general;
+   give a 1-2 sentence problem_summary and the key details. Do NOT transcribe the entire image text.
+2. solution: solve it, filling ONLY the fields for that type:
+- coding: algorithm_steps (each step a SEPARATE element), code (raw code, use \\n for newlines, NO markdown backticks),
+  language, time_complexity, space_complexity, edge_cases (each case a SEPARATE element)
+- multiple_choice: selected_option, option_letter, all_options, explanation
+- math: final_answer, step_by_step (one step per element), formula_used
+- general: answer and reasoning
+
+Return strict JSON."""
+
+
+# ── Schemas & per-type prompts ──────────────────────────────────
+# Built once at import; treat as read-only (passed straight to the SDK)
+
+_EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "problem_type": {
+            "type": "string",
+            "enum": ["coding", "multiple_choice", "math", "general"],
+        },
+        "problem_summary": {
+            "type": "string",
+            "description": "1-2 sentence brief summary",
+        },
+        "details": {
+            "type": "object",
+            "description": "Extracted key entities relevant to the problem type",
+        },
+    },
+    "required": ["problem_type", "problem_summary", "details"],
+}
+
+_CODING_ROLE = "You are a Senior Software Engineer. Provide an optimal, complete code solution for the problem in the image."
+_CODING_OUTPUT_DESC = (
+    "Return strict JSON. CRITICAL RULES:\n"
+    "- algorithm_steps: each step MUST be a SEPARATE array element. Never merge multiple steps into one string.\n"
+    "- code: raw code only. Use \\n for newlines. Do NOT include markdown backticks.\n"
+    "- edge_cases: each case as a SEPARATE array element."
+)
+_CODING_SOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "solution": {
+            "type": "object",
+            "properties": {
+                "algorithm_steps": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Each step as a SEPARATE element. Do NOT merge steps.",
+                },
+                "code": {
+                    "type": "string",
+                    "description": "Complete solution code. Use \\n for newlines. NO markdown backticks.",
+                },
+                "language": {
+                    "type": "string",
+                    "description": "Programming language used (e.g. python, java, cpp)",
+                },
+                "time_complexity": {"type": "string"},
+                "space_complexity": {"type": "string"},
+                "edge_cases": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Each edge case as a SEPARATE element.",
+                },
+            },
+            "required": ["algorithm_steps", "code", "language", "time_complexity", "space_complexity", "edge_cases"],
+        }
+    },
+}
+
+_MULTIPLE_CHOICE_ROLE = "You are an expert tutor. Identify the correct answer from the multiple-choice options shown in the image."
+_MULTIPLE_CHOICE_OUTPUT_DESC = (
+    "Return strict JSON containing:\n"
+    "- selected_option: the full text of the correct option\n"
+    "- option_letter: the letter/number of the correct option (e.g. 'A', 'B', '1', '2')\n"
+    "- all_options: object mapping each letter to its text\n"
+    "- explanation: clear reasoning for why this is correct"
+)
+_MULTIPLE_CHOICE_SOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "solution": {
+            "type": "object",
+            "properties": {
+                "selected_option": {"type": "string"},
+                "option_letter": {"type": "string"},
+                "all_options": {
+                    "type": "object",
+                    "description": "Map of letter/number -> option text",
+                },
+                "explanation": {"type": "string"},
+            },
+            "required": ["selected_option", "option_letter", "explanation"],
+        }
+    },
+}
+
+_MATH_ROLE = "You are an expert mathematician. Solve the math problem shown in the image step-by-step."
+_MATH_OUTPUT_DESC = (
+    "Return strict JSON containing:\n"
+    "- final_answer: the final numeric or symbolic answer\n"
+    "- step_by_step: array where each element is one step of the solution\n"
+    "- formula_used: key formula(s) applied"
+)
+_MATH_SOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "solution": {
+            "type": "object",
+            "properties": {
+                "final_answer": {"type": "string"},
+                "step_by_step": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Each step of the solution as a SEPARATE element.",
+                },
+                "formula_used": {"type": "string"},
+            },
+            "required": ["final_answer", "step_by_step"],
+        }
+    },
+}
+
+_SPECULATIVE_ROLE = "You are an expert tutor and analyst. Solve the problem shown in the image (it is NOT a coding task)."
+_SPECULATIVE_OUTPUT_DESC = (
+    "Return strict JSON. Fill ONLY the fields that match the problem:\n"
+    "- multiple choice: selected_option, option_letter, all_options, explanation\n"
+    "- math: final_answer, step_by_step (one step per element), formula_used\n"
+    "- anything else: answer and reasoning"
+)
+_SPECULATIVE_SOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "solution": {
+            "type": "object",
+            "properties": {
+                "selected_option": {"type": "string"},
+                "option_letter": {"type": "string"},
+                "all_options": {
+                    "type": "object",
+                    "description": "Map of letter/number -> option text",
+                },
+                "explanation": {"type": "string"},
+                "final_answer": {"type": "string"},
+                "step_by_step": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Each step of the solution as a SEPARATE element.",
+                },
+                "formula_used": {"type": "string"},
+                "answer": {"type": "string"},
+                "reasoning": {"type": "string"},
+            },
+        }
+    },
+}
+
+_GENERAL_ROLE = "You are a helpful expert assistant. Answer the question shown in the image clearly and thoroughly."
+_GENERAL_OUTPUT_DESC = "Return strict JSON containing the answer and detailed reasoning."
+_GENERAL_SOLUTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "solution": {
+            "type": "object",
+            "properties": {
+                "answer": {"type": "string"},
+                "reasoning": {"type": "string"},
+            },
+            "required": ["answer", "reasoning"],
+        }
+    },
+}
+
+# ptype -> (role_prompt, output_desc, schema)
+_TYPE_CONFIGS = {
+    "coding": (_CODING_ROLE, _CODING_OUTPUT_DESC, _CODING_SOLUTION_SCHEMA),
+    "multiple_choice": (_MULTIPLE_CHOICE_ROLE, _MULTIPLE_CHOICE_OUTPUT_DESC, _MULTIPLE_CHOICE_SOLUTION_SCHEMA),
+    "math": (_MATH_ROLE, _MATH_OUTPUT_DESC, _MATH_SOLUTION_SCHEMA),
+    "speculative": (_SPECULATIVE_ROLE, _SPECULATIVE_OUTPUT_DESC, _SPECULATIVE_SOLUTION_SCHEMA),
+    "general": (_GENERAL_ROLE, _GENERAL_OUTPUT_DESC, _GENERAL_SOLUTION_SCHEMA),
+}
+
+# problem_info plus one flat solution object holding every type's fields.
+# A flat object is used instead of oneOf, which Gemini's response schema
+# does not reliably accept.
+_FUSED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "problem_info": _EXTRACTION_SCHEMA,
+        "solution": {
+            "type": "object",
+            "properties": {
+                **_CODING_SOLUTION_SCHEMA["properties"]["solution"]["properties"],
+                **_SPECULATIVE_SOLUTION_SCHEMA["properties"]["solution"]["properties"],
+            },
+        },
+    },
+    "required": ["problem_info", "solution"],
+}
+
+
+# Markdown layouts for the streamed solution; they mirror the _fmt_* formatters
+_STREAM_FORMATS = {
+    "coding": (
+        "Respond in Markdown with these sections, in order:\n"
+        "### Algorithm Steps — numbered, one step per line\n"
+        "### Code — one complete fenced code block tagged with its language\n"
+        "### Edge Cases — one bullet per case\n"
+        "### Complexity — **Time:** and **Space:** lines"
+    ),
+    "multiple_choice": (
+        "Respond in Markdown with these sections, in order:\n"
+        "### Answer: **<letter>** followed by the option text as a > quote\n"
+        "### Options — every option as **<letter>.** <text>, marking the correct one with ✅\n"
+        "### Explanation — why this option is correct"
+    ),
+    "math": (
+        "Respond in Markdown with these sections, in order:\n"
+        "### Step-by-Step Solution — numbered, one step per line\n"
+        "### Final Answer — the answer in bold\n"
+        "### Formula Used — the key formula(s) applied"
+    ),
+    "general": (
+        "Respond in Markdown with these sections, in order:\n"
+        "### Analysis — detailed reasoning\n"
+        "### Answer — the clear, concise answer"
+    ),
+}
+
 class SmartGeminiProvider(GeminiProvider):
-    def __init__(self, api_key: str, model_name: str = "gemini-3.1-flash-lite-preview"):
-        super().__init__(api_key, model_name)
-        logger.info(f"TOON support: {'active' if is_toon_available() else 'JSON fallback'}")
+    # Classification output is a short summary plus a details object
+    CLASSIFY_MAX_OUTPUT_TOKENS = 1024
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-3.1-flash-lite-preview",
+        max_image_edge: Optional[int] = DEFAULT_MAX_IMAGE_EDGE,
+        fused: bool = True,
+        two_step_fallback: bool = True
+    ):
+        super().__init__(api_key, model_name, max_image_edge)
+        # fused: classify and solve in one request; two_step_fallback: retry
+        # with the classify -> solve pipeline when the fused output is unusable
+        self.fused = fused
+        self.two_step_fallback = two_step_fallback
+        # Classification and the speculative solve run side by side
+        self._pipeline_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="smart-pipeline")
+        logger.info("TOON support: %s", "active" if is_toon_available() else "JSON fallback")
 
     def send_message(
         self,
@@ -44,24 +340,114 @@ class SmartGeminiProvider(GeminiProvider):
         images: Optional[List[Image.Image]] = None,
         audio_file: Optional[str] = None,
         system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Synchronous entry point for callers like MainWindow.
+        Runs asend_message on a fresh event loop.
+        """
+        return asyncio.run(self.asend_message(text, images, audio_file, system_prompt))
+
+    async def asend_message(
+        self,
+        text: str,
+        images: Optional[List[Image.Image]] = None,
+        audio_file: Optional[str] = None,
+        system_prompt: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Smart/Chain-of-Thought send message:
-        1. If images provided, classify and extract problem info.
-        2. Generate solution based on classification.
+        1. If images provided, classify and solve in a single fused call.
+        2. If the fused output is unusable (and two_step_fallback is set),
+           classify while a speculative non-coding solution is generated in
+           parallel, solving again only for coding or missed fields.
         3. Return formatted response.
         """
         if not images:
             logger.info("No images provided. Bypassing smart flow to standard routing.")
-            return super().send_message(text, images, audio_file, system_prompt)
+            return await self._run_blocking(
+                super().send_message, text, images, audio_file, system_prompt
+            )
 
         pipeline_start = time.time()
+        parts = None
+
+        try:
+            parts = await self._run_blocking(self._preprocess_images, images)
+
+            result = None
+            if self.fused:
+                result = await self._apipeline_fused(text, parts, pipeline_start)
+                if result is None and not self.two_step_fallback:
+                    raise LLMGenerationError("Fused call returned an unusable solution")
+            if result is None:
+                result = await self._apipeline_two_step(text, parts, pipeline_start)
+            return result
+
+        except (LLMExtractionError, LLMGenerationError, LLMFormattingError) as e:
+            logger.error("Smart pipeline error (%s): %s", type(e).__name__, e)
+            logger.info("Falling back to standard (non-smart) generation...")
+
+        except Exception as e:
+            logger.error("Unexpected error in SmartProvider: %s", e, exc_info=True)
+            logger.info("Falling back to standard (non-smart) generation...")
+
+        return await self._run_blocking(
+            super().send_message, text, parts or images, audio_file, system_prompt
+        )
+
+    def _preprocess_images(self, images: List[Image.Image]) -> List[Any]:
+        """
+        Downscale (to max_image_edge) and encode every image exactly once.
+        The parts are reused by all pipeline requests, including the
+        non-smart fallback, so no step re-uploads the raw screenshot.
+        """
+        return self._image_parts(images)
+
+    async def _apipeline_fused(self, text: str, parts: List[Any], pipeline_start: float) -> Optional[Dict[str, Any]]:
+        """One round-trip: classification and solution from the same response. None if unusable."""
+        logger.info("[%s] Fused classify+solve...", self._model_name)
+        t = time.time()
+        fused = await self._run_blocking(self._step_fused, text, parts)
+        elapsed = time.time() - t
+
+        problem_info = fused.get("problem_info") if isinstance(fused, dict) else None
+        if not isinstance(problem_info, dict) or "error" in fused:
+            # The model may answer with a list, string or null instead of an object
+            reason = fused.get('error', 'no problem_info') if isinstance(fused, dict) else 'no problem_info'
+            logger.warning(
+                "[%s] Fused call failed after %.1fs: %s",
+                self._model_name, elapsed, reason,
+            )
+            return None
+
+        ptype = problem_info.get("problem_type", "unknown")
+        solution_data = {"solution": fused.get("solution")}
+        if not self._solution_usable(solution_data, ptype):
+            logger.warning("[%s] Fused solution unusable for type=%s (%.1fs)", self._model_name, ptype, elapsed)
+            return None
 
+        logger.info(
+            "[%s] Fused call complete (%.1fs) -> Type: %s | Summary: %s",
+            self._model_name, elapsed, ptype, (problem_info.get('problem_summary') or '')[:80],
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Fused full result: %s", json.dumps(fused, default=str)[:500])
+
+        return self._build_result(problem_info, solution_data, pipeline_start, {
+            'mode': 'fused',
+            'fused_s': round(elapsed, 2),
+        })
+
+    async def _apipeline_two_step(self, text: str, parts: List[Any], pipeline_start: float) -> Dict[str, Any]:
+        """Classification overlapped with a speculative non-coding solve."""
+        speculative_task = None
         try:
-            # ── Step 1: Classify & Extract ──────────────────────────
-            logger.info(f"[{self._model_name}] Step 1: Extracting problem details...")
+            # ── Step 1: Classify & Extract (+ speculative solve) ────
+            logger.info("[%s] Step 1: Extracting problem details (speculative solve running)...", self._model_name)
             t1 = time.time()
-            problem_info = self._step_classify_and_extract(text, images)
+            classify_task = asyncio.create_task(self._astep_classify_and_extract(text, parts))
+            speculative_task = asyncio.create_task(self._astep_speculative_solution(text, parts))
+            problem_info = await classify_task
             t1_elapsed = time.time() - t1
 
             if "error" in problem_info:
@@ -71,15 +457,27 @@ class SmartGeminiProvider(GeminiProvider):
 
             ptype = problem_info.get("problem_type", "unknown")
             logger.info(
-                f"[{self._model_name}] Step 1 Complete ({t1_elapsed:.1f}s) -> "
-                f"Type: {ptype} | Summary: {problem_info.get('problem_summary', '')[:80]}"
+                "[%s] Step 1 Complete (%.1fs) -> Type: %s | Summary: %s",
+                self._model_name, t1_elapsed, ptype, (problem_info.get('problem_summary') or '')[:80],
             )
-            logger.debug(f"Step 1 full result: {json.dumps(problem_info, default=str)[:500]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Step 1 full result: %s", json.dumps(problem_info, default=str)[:500])
 
             # ── Step 2: Generate Solution ───────────────────────────
-            logger.info(f"[{self._model_name}] Step 2: Generating solution (type={ptype})...")
             t2 = time.time()
-            solution_data = self._step_generate_solution(problem_info, images)
+            solution_data = None
+            if ptype == "coding":
+                speculative_task.cancel()
+            else:
+                solution_data = await speculative_task
+                if not self._solution_usable(solution_data, ptype):
+                    logger.info("[%s] Speculative solution unusable for type=%s", self._model_name, ptype)
+                    solution_data = None
+            speculative_hit = solution_data is not None
+
+            if solution_data is None:
+                logger.info("[%s] Step 2: Generating solution (type=%s)...", self._model_name, ptype)
+                solution_data = await self._astep_generate_solution(problem_info, parts)
             t2_elapsed = time.time() - t2
 
             if "error" in solution_data:
@@ -87,93 +485,254 @@ class SmartGeminiProvider(GeminiProvider):
                     f"Generation returned error: {solution_data['error']}",
                 )
 
-            logger.info(f"[{self._model_name}] Step 2 Complete ({t2_elapsed:.1f}s)")
-            logger.debug(f"Step 2 full result: {json.dumps(solution_data, default=str)[:500]}")
-
-            # ── Step 3: Format ──────────────────────────────────────
-            try:
-                final_markdown = self._format_solution_markdown(solution_data, problem_info)
-            except Exception as fmt_err:
-                raise LLMFormattingError(
-                    f"Formatting failed: {fmt_err}", original_error=fmt_err
-                )
-
-            total_elapsed = time.time() - pipeline_start
             logger.info(
-                f"[{self._model_name}] Pipeline finished in {total_elapsed:.1f}s "
-                f"(extract={t1_elapsed:.1f}s, solve={t2_elapsed:.1f}s)"
+                "[%s] Step 2 Complete (%.1fs, speculative=%s)",
+                self._model_name, t2_elapsed, "hit" if speculative_hit else "miss",
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Step 2 full result: %s", json.dumps(solution_data, default=str)[:500])
+
+            return self._build_result(problem_info, solution_data, pipeline_start, {
+                'mode': 'two_step',
+                'speculative_hit': speculative_hit,
+                'extraction_s': round(t1_elapsed, 2),
+                'generation_s': round(t2_elapsed, 2),
+            })
+        finally:
+            if speculative_task is not None:
+                speculative_task.cancel()
+
+    def _build_result(
+        self,
+        problem_info: Dict[str, Any],
+        solution_data: Dict[str, Any],
+        pipeline_start: float,
+        timing: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Step 3: format the solution and assemble the response dict."""
+        try:
+            final_markdown = self._format_solution_markdown(solution_data, problem_info)
+        except Exception as fmt_err:
+            raise LLMFormattingError(
+                f"Formatting failed: {fmt_err}", original_error=fmt_err
             )
 
-            return {
-                'response': final_markdown,
-                'metadata': {
-                    'model': self._model_name,
-                    'problem_info': problem_info,
-                    'raw_solution': solution_data,
-                    'timing': {
-                        'extraction_s': round(t1_elapsed, 2),
-                        'generation_s': round(t2_elapsed, 2),
-                        'total_s': round(total_elapsed, 2),
-                    },
-                }
+        total_elapsed = time.time() - pipeline_start
+        timing['total_s'] = round(total_elapsed, 2)
+        logger.info("[%s] Pipeline finished in %.1fs (%s)", self._model_name, total_elapsed, timing)
+
+        return {
+            'response': final_markdown,
+            'metadata': {
+                'model': self._model_name,
+                'problem_info': problem_info,
+                'raw_solution': solution_data,
+                'timing': timing,
             }
+        }
 
-        except (LLMExtractionError, LLMGenerationError, LLMFormattingError) as e:
-            logger.error(f"Smart pipeline error ({type(e).__name__}): {e}")
-            logger.info("Falling back to standard (non-smart) generation...")
-            return super().send_message(text, images, audio_file, system_prompt)
-
-        except Exception as e:
-            logger.error(f"Unexpected error in SmartProvider: {e}", exc_info=True)
-            logger.info("Falling back to standard (non-smart) generation...")
-            return super().send_message(text, images, audio_file, system_prompt)
+    async def _run_blocking(self, fn, *args):
+        """
+        Run a blocking SDK call on the provider's own executor. Unlike
+        asyncio.to_thread, a cancelled call that is still in flight does not
+        hold up asyncio.run() shutdown; its result is simply discarded.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pipeline_pool, functools.partial(fn, *args))
 
     # ──────────────────────────────────────────────────────────────
-    # Step 1: Classify & Extract
+    # Fused: Classify + Solve in one call
     # ──────────────────────────────────────────────────────────────
 
-    def _step_classify_and_extract(self, user_prompt: str, images: List[Image.Image]) -> Dict[str, Any]:
-        # Build the instruction using TOON-encoded hints for token efficiency
+    def _step_fused(self, user_prompt: str, images: List[Any]) -> Dict[str, Any]:
         hints_toon = encode_extraction_hints(user_prompt)
 
-        system_instruction = f"""\
-You are an expert analyst. Analyze the provided image(s) carefully.
-
-CLASSIFICATION & EXTRACTION TASK (context in TOON):
-{hints_toon}
+        return self.send_with_json_output(
+            text=f"USER CONTEXT (TOON Format):\n{hints_toon}",
+            json_schema=_FUSED_SCHEMA,
+            images=images,
+            system_instruction=_FUSED_INSTRUCTION,
+        )
 
-STEP 1: CLASSIFY THE PROBLEM TYPE
-Determine exactly ONE of: coding, multiple_choice, math, general
+    # ──────────────────────────────────────────────────────────────
+    # Streaming
+    # ──────────────────────────────────────────────────────────────
 
-STEP 2: EXTRACT KEY DATA
-- problem_summary: 1-2 sentence brief summary
-- details: key entities (language, options, variables, constraints, etc.)
+    def send_message_stream(
+        self,
+        text: str,
+        images: Optional[List[Image.Image]] = None,
+        audio_file: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Classify synchronously, then stream the solution as markdown, calling
+        on_token(chunk) as text arrives (on the calling thread). Returns the
+        send_message-shaped dict with the full text once the stream ends.
+        Two sequential calls: first text appears sooner than send_message's
+        fused reply, but the total time is usually longer (the UI's opt-in
+        ui.stream_responses path).
+        """
+        chunks: List[str] = []
 
-Return a valid JSON object. Do NOT transcribe the entire image text."""
+        def emit(chunk: str):
+            chunks.append(chunk)
+            if on_token:
+                on_token(chunk)
 
-        extraction_schema = {
-            "type": "object",
-            "properties": {
-                "problem_type": {
-                    "type": "string",
-                    "enum": ["coding", "multiple_choice", "math", "general"],
-                },
-                "problem_summary": {
-                    "type": "string",
-                    "description": "1-2 sentence brief summary",
-                },
-                "details": {
-                    "type": "object",
-                    "description": "Extracted key entities relevant to the problem type",
-                },
-            },
-            "required": ["problem_type", "problem_summary", "details"],
+        pipeline_start = time.time()
+        problem_info: Dict[str, Any] = {}
+        parts = images
+
+        if images:
+            parts = self._preprocess_images(images)
+            logger.info("[%s] Step 1 (stream): Extracting problem details...", self._model_name)
+            problem_info = self._step_classify_and_extract(text, parts)
+
+        if not images or "error" in problem_info:
+            if images:
+                logger.error("Extraction returned error: %s", problem_info["error"])
+                logger.info("Falling back to standard (non-smart) streaming...")
+                problem_info = {}
+            for chunk in super().stream_response(text, parts, audio_file, system_prompt):
+                emit(chunk)
+        else:
+            ptype = problem_info.get("problem_type", "general")
+            role_prompt, _, _ = self._get_type_config(ptype)
+            instruction = f"{role_prompt}\n\n{_STREAM_FORMATS.get(ptype, _STREAM_FORMATS['general'])}"
+            prompt = self._solution_prompt(problem_info, ptype)
+
+            logger.info("[%s] Step 2 (stream): Streaming solution (type=%s)...", self._model_name, ptype)
+            emit(f"**Type:** `{ptype.replace('_', ' ').upper()}`\n\n")
+            for chunk in super().stream_response(prompt, parts, None, instruction):
+                emit(chunk)
+
+        total_elapsed = time.time() - pipeline_start
+        logger.info("[%s] Stream finished in %.1fs", self._model_name, total_elapsed)
+        return {
+            'response': "".join(chunks),
+            'metadata': {
+                'model': self._model_name,
+                'problem_info': problem_info,
+                'timing': {'mode': 'stream', 'total_s': round(total_elapsed, 2)},
+            }
         }
 
+    # ──────────────────────────────────────────────────────────────
+    # Batch Mode
+    # ──────────────────────────────────────────────────────────────
+
+    def send_messages_batch(
+        self,
+        items: List[Dict[str, Any]],
+        timeout_s: float = BATCH_TIMEOUT_S
+    ) -> List[Dict[str, Any]]:
+        """
+        Run many fused classify+solve requests as one Gemini batch job, for
+        throughput-oriented callers (batch jobs are cheaper but not realtime).
+        API-only: the app itself never calls this; it is meant for scripts
+        that process many captures offline.
+        Each item holds send_message kwargs ('text', 'images', ...); results
+        come back in item order with send_message's shape. Falls back to a
+        thread pool over send_message if the job fails or times out.
+        """
+        if not items:
+            return []
+
+        start = time.time()
+        try:
+            responses = self._run_batch_job(items, timeout_s)
+        except Exception as e:
+            logger.warning("Batch mode unavailable (%s); running %s item(s) concurrently", e, len(items))
+            with ThreadPoolExecutor(max_workers=BATCH_FALLBACK_WORKERS) as pool:
+                return list(pool.map(lambda item: self.send_message(**item), items))
+
+        results = []
+        for item, fused in zip(items, responses):
+            result = self._fused_to_result(fused, start)
+            if result is None:
+                # Same recovery as send_message: the full pipeline for this item only
+                result = self.send_message(**item)
+            results.append(result)
+        logger.info("Batch of %s item(s) finished in %.1fs", len(items), time.time() - start)
+        return results
+
+    def _run_batch_job(self, items: List[Dict[str, Any]], timeout_s: float) -> List[Dict[str, Any]]:
+        """Submit inline fused requests, poll with backoff, return parsed JSON per item."""
+        config = types.GenerateContentConfig(
+            system_instruction=_FUSED_INSTRUCTION,
+            response_mime_type="application/json",
+            response_schema=_FUSED_SCHEMA,
+            temperature=0.1,
+            candidate_count=1,
+        )
+        requests = []
+        for item in items:
+            hints_toon = encode_extraction_hints(item.get("text", ""))
+            parts = [types.Part.from_text(text=f"USER CONTEXT (TOON Format):\n{hints_toon}")]
+            if item.get("images"):
+                parts.extend(self._preprocess_images(item["images"]))
+            requests.append(types.InlinedRequest(
+                contents=[types.Content(role="user", parts=parts)],
+                config=config,
+            ))
+
+        job = self.client.batches.create(model=self._model_name, src=requests)
+        logger.info("Submitted batch job %s (%s request(s))", job.name, len(requests))
+
+        delay = 2.0
+        deadline = time.time() + timeout_s
+        while job.state.name not in _BATCH_DONE_STATES:
+            if time.time() >= deadline:
+                self.client.batches.cancel(name=job.name)
+                raise TimeoutError(f"batch job {job.name} still {job.state.name} after {timeout_s:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 1.5, 30.0)
+            job = self.client.batches.get(name=job.name)
+
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            raise LLMGenerationError(f"batch job {job.name} ended in {job.state.name}")
+
+        responses = []
+        for inlined in job.dest.inlined_responses:
+            if inlined.error or not inlined.response:
+                responses.append({"error": str(inlined.error or "empty response")})
+            else:
+                responses.append(self.parse_structured_output(inlined.response.text or ""))
+        return responses
+
+    def _fused_to_result(self, fused: Any, pipeline_start: float) -> Optional[Dict[str, Any]]:
+        """send_message-shaped result from one fused JSON reply, or None if unusable."""
+        # parse_structured_output may yield a list or None instead of an object
+        if not isinstance(fused, dict):
+            return None
+        problem_info = fused.get("problem_info")
+        if "error" in fused or not isinstance(problem_info, dict):
+            return None
+        ptype = problem_info.get("problem_type", "unknown")
+        solution_data = {"solution": fused.get("solution")}
+        if not self._solution_usable(solution_data, ptype):
+            return None
+        try:
+            return self._build_result(problem_info, solution_data, pipeline_start, {'mode': 'batch'})
+        except LLMFormattingError:
+            return None
+
+    # ──────────────────────────────────────────────────────────────
+    # Step 1: Classify & Extract
+    # ──────────────────────────────────────────────────────────────
+
+    def _step_classify_and_extract(self, user_prompt: str, images: List[Image.Image]) -> Dict[str, Any]:
+        # Build the instruction using TOON-encoded hints for token efficiency
+        hints_toon = encode_extraction_hints(user_prompt)
+
         return self.send_with_json_output(
-            text=system_instruction,
-            json_schema=extraction_schema,
+            text=f"CLASSIFICATION & EXTRACTION TASK (context in TOON):\n{hints_toon}",
+            json_schema=_EXTRACTION_SCHEMA,
             images=images,
+            max_output_tokens=self.CLASSIFY_MAX_OUTPUT_TOKENS,
+            system_instruction=_CLASSIFY_INSTRUCTION,
         )
 
     # ──────────────────────────────────────────────────────────────
@@ -182,151 +741,136 @@ Return a valid JSON object. Do NOT transcribe the entire image text."""
 
     def _step_generate_solution(self, problem_info: Dict[str, Any], images: List[Image.Image]) -> Dict[str, Any]:
         ptype = problem_info.get("problem_type", "general")
+        role_prompt, output_desc, solution_schema = self._get_type_config(ptype)
+        prompt = self._solution_prompt(problem_info, ptype)
 
-        # Encode full classification context in TOON for token efficiency
-        context_str = encode_problem_context(problem_info, ptype)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Step 2 prompt length: %s chars, schema keys: %s",
+                len(prompt),
+                list(solution_schema.get('properties', {}).get('solution', {}).get('properties', {}).keys()),
+            )
 
-        role_prompt, output_desc, solution_schema = self._get_type_config(ptype)
+        # Role and output rules are static per type, so they go in the cacheable instruction
+        return self.send_with_json_output(
+            text=prompt,
+            json_schema=solution_schema,
+            images=images,
+            system_instruction=f"{role_prompt}\n\n{output_desc}",
+        )
 
-        prompt = f"""\
-{role_prompt}
+    def _solution_prompt(self, problem_info: Dict[str, Any], ptype: str) -> str:
+        """
+        Step 2 prompt: classification context in TOON, with large extracted
+        fields moved out into labeled sections so they are serialized once.
+        """
+        light_info, heavy = self._split_heavy_details(problem_info)
 
-CLASSIFICATION CONTEXT (TOON Format):
-{context_str}
+        # Encode the (now small) classification context in TOON for token efficiency
+        context_str = encode_problem_context(light_info, ptype)
 
-TASK:
-Solve the problem shown in the image. Use the classification context above to focus your answer.
-{output_desc}"""
+        sections = [f"CLASSIFICATION CONTEXT (TOON Format):\n{context_str}"]
+        code = heavy.get("code_snippet")
+        if code:
+            lang = (light_info.get("details") or {}).get("language", "")
+            sections.append(f"CODE:\n```{lang}\n{code}\n```")
+        statement = heavy.get("problem_statement")
+        if statement:
+            sections.append(f"PROBLEM STATEMENT:\n{statement}")
+        sections.append(
+            "TASK:\nSolve the problem shown in the image. "
+            "Use the classification context above to focus your answer."
+        )
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _split_heavy_details(problem_info: Dict[str, Any]):
+        """
+        Return (problem_info with large detail fields replaced by markers,
+        {field: original text}). problem_info itself is left untouched.
+        """
+        details = problem_info.get("details")
+        if not isinstance(details, dict):
+            return problem_info, {}
+
+        heavy = {
+            key: details[key]
+            for key in _HEAVY_DETAIL_FIELDS
+            if isinstance(details.get(key), str) and len(details[key]) > HEAVY_FIELD_CHARS
+        }
+        if not heavy:
+            return problem_info, {}
+
+        light_details = {**details, **{key: _HEAVY_DETAIL_FIELDS[key] for key in heavy}}
+        return {**problem_info, "details": light_details}, heavy
+
+    # ──────────────────────────────────────────────────────────────
+    # Async step variants
+    # ──────────────────────────────────────────────────────────────
+
+    async def _astep_classify_and_extract(self, user_prompt: str, images: List[Any]) -> Dict[str, Any]:
+        return await self._run_blocking(self._step_classify_and_extract, user_prompt, images)
 
-        logger.debug(f"Step 2 prompt length: {len(prompt)} chars, schema keys: {list(solution_schema.get('properties', {}).get('solution', {}).get('properties', {}).keys())}")
+    async def _astep_generate_solution(self, problem_info: Dict[str, Any], images: List[Any]) -> Dict[str, Any]:
+        return await self._run_blocking(self._step_generate_solution, problem_info, images)
+
+    async def _astep_speculative_solution(self, user_prompt: str, images: List[Any]) -> Dict[str, Any]:
+        return await self._run_blocking(self._step_speculative_solution, user_prompt, images)
+
+    def _step_speculative_solution(self, user_prompt: str, images: List[Any]) -> Dict[str, Any]:
+        """
+        Solve without classification context, using a schema that covers every
+        non-coding type. Runs concurrently with step 1 and is thrown away if
+        the problem turns out to be coding.
+        """
+        role_prompt, output_desc, solution_schema = self._get_type_config("speculative")
+        hints_toon = encode_extraction_hints(user_prompt)
+
+        prompt = f"""\
+USER CONTEXT (TOON Format):
+{hints_toon}
+
+TASK:
+Solve the problem shown in the image."""
 
         return self.send_with_json_output(
             text=prompt,
             json_schema=solution_schema,
             images=images,
+            system_instruction=f"{role_prompt}\n\n{output_desc}",
         )
 
+    @staticmethod
+    def _solution_usable(solution_data: Dict[str, Any], ptype: str) -> bool:
+        """True if the solution filled the fields the formatter for `ptype` relies on."""
+        if not isinstance(solution_data, dict) or "error" in solution_data:
+            return False
+        sol = solution_data.get("solution")
+        if not isinstance(sol, dict):
+            return False
+        needed = {
+            "coding": ("code",),
+            "multiple_choice": ("option_letter", "explanation"),
+            "math": ("final_answer", "step_by_step"),
+        }.get(ptype, ("answer",))
+        return all(sol.get(key) for key in needed)
+
     def _get_type_config(self, ptype: str):
         """Return (role_prompt, output_desc, schema) for each problem type."""
-
-        if ptype == "coding":
-            role = "You are a Senior Software Engineer. Provide an optimal, complete code solution for the problem in the image."
-            desc = (
-                "Return strict JSON. CRITICAL RULES:\n"
-                "- algorithm_steps: each step MUST be a SEPARATE array element. Never merge multiple steps into one string.\n"
-                "- code: raw code only. Use \\n for newlines. Do NOT include markdown backticks.\n"
-                "- edge_cases: each case as a SEPARATE array element."
-            )
-            schema = {
-                "type": "object",
-                "properties": {
-                    "solution": {
-                        "type": "object",
-                        "properties": {
-                            "algorithm_steps": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "Each step as a SEPARATE element. Do NOT merge steps.",
-                            },
-                            "code": {
-                                "type": "string",
-                                "description": "Complete solution code. Use \\n for newlines. NO markdown backticks.",
-                            },
-                            "language": {
-                                "type": "string",
-                                "description": "Programming language used (e.g. python, java, cpp)",
-                            },
-                            "time_complexity": {"type": "string"},
-                            "space_complexity": {"type": "string"},
-                            "edge_cases": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "Each edge case as a SEPARATE element.",
-                            },
-                        },
-                        "required": ["algorithm_steps", "code", "language", "time_complexity", "space_complexity", "edge_cases"],
-                    }
-                },
-            }
-
-        elif ptype == "multiple_choice":
-            role = "You are an expert tutor. Identify the correct answer from the multiple-choice options shown in the image."
-            desc = (
-                "Return strict JSON containing:\n"
-                "- selected_option: the full text of the correct option\n"
-                "- option_letter: the letter/number of the correct option (e.g. 'A', 'B', '1', '2')\n"
-                "- all_options: object mapping each letter to its text\n"
-                "- explanation: clear reasoning for why this is correct"
-            )
-            schema = {
-                "type": "object",
-                "properties": {
-                    "solution": {
-                        "type": "object",
-                        "properties": {
-                            "selected_option": {"type": "string"},
-                            "option_letter": {"type": "string"},
-                            "all_options": {
-                                "type": "object",
-                                "description": "Map of letter/number -> option text",
-                            },
-                            "explanation": {"type": "string"},
-                        },
-                        "required": ["selected_option", "option_letter", "explanation"],
-                    }
-                },
-            }
-
-        elif ptype == "math":
-            role = "You are an expert mathematician. Solve the math problem shown in the image step-by-step."
-            desc = (
-                "Return strict JSON containing:\n"
-                "- final_answer: the final numeric or symbolic answer\n"
-                "- step_by_step: array where each element is one step of the solution\n"
-                "- formula_used: key formula(s) applied"
-            )
-            schema = {
-                "type": "object",
-                "properties": {
-                    "solution": {
-                        "type": "object",
-                        "properties": {
-                            "final_answer": {"type": "string"},
-                            "step_by_step": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "Each step of the solution as a SEPARATE element.",
-                            },
-                            "formula_used": {"type": "string"},
-                        },
-                        "required": ["final_answer", "step_by_step"],
-                    }
-                },
-            }
-
-        else:  # general
-            role = "You are a helpful expert assistant. Answer the question shown in the image clearly and thoroughly."
-            desc = "Return strict JSON containing the answer and detailed reasoning."
-            schema = {
-                "type": "object",
-                "properties": {
-                    "solution": {
-                        "type": "object",
-                        "properties": {
-                            "answer": {"type": "string"},
-                            "reasoning": {"type": "string"},
-                        },
-                        "required": ["answer", "reasoning"],
-                    }
-                },
-            }
-
-        return role, desc, schema
+        return _TYPE_CONFIGS.get(ptype, _TYPE_CONFIGS["general"])
 
     # ──────────────────────────────────────────────────────────────
     # Step 3: Format to Markdown
     # ──────────────────────────────────────────────────────────────
 
+    # problem_type -> formatter method name; resolved per call without rebuilding a dict
+    _FORMATTERS = {
+        "coding": "_fmt_coding",
+        "multiple_choice": "_fmt_multiple_choice",
+        "math": "_fmt_math",
+        "general": "_fmt_general",
+    }
+
     def _format_solution_markdown(self, solution_data: Dict[str, Any], problem_info: Dict[str, Any]) -> str:
         """
         Dispatch to a type-specific formatter.  Falls back to raw-dump if
@@ -340,149 +884,134 @@ Solve the problem shown in the image. Use the classification context above to fo
             return self._format_raw_fallback(solution_data, ptype)
 
         try:
-            formatters = {
-                "coding": self._fmt_coding,
-                "multiple_choice": self._fmt_multiple_choice,
-                "math": self._fmt_math,
-                "general": self._fmt_general,
-            }
-            formatter = formatters.get(ptype, self._fmt_general)
+            formatter = getattr(self, self._FORMATTERS.get(ptype, "_fmt_general"))
             return formatter(sol, problem_info)
         except Exception as e:
-            logger.error(f"Formatter crashed for type={ptype}: {e}", exc_info=True)
+            logger.error("Formatter crashed for type=%s: %s", ptype, e, exc_info=True)
             return self._format_raw_fallback(solution_data, ptype)
 
     # ── Coding Formatter ────────────────────────────────────────
 
     def _fmt_coding(self, sol: Dict, info: Dict) -> str:
-        md = "**Type:** `CODING`\n\n"
+        parts: List[str] = ["**Type:** `CODING`\n\n"]
 
         # Algorithm Steps — prefer the JSON array directly, regex as last resort
         steps = self._safe_list(sol, "algorithm_steps")
         if steps:
-            md += "### Algorithm Steps\n\n"
-            for i, step in enumerate(steps, 1):
-                md += f"**{i}.** {step}<br>\n"
-            md += "\n"
+            parts.append("### Algorithm Steps\n\n")
+            parts.append("".join(f"**{i}.** {step}<br>\n" for i, step in enumerate(steps, 1)))
+            parts.append("\n")
 
         # Code
         code = self._sanitize_code(sol.get("code", "") or sol.get("answer", ""))
-        lang = (
-            sol.get("language")
-            or info.get("details", {}).get("language")
-            or "python"
-        )
+        details = info.get("details") or {}
+        lang = sol.get("language") or details.get("language") or "python"
         if code:
-            md += f"### Code\n\n```{lang}\n{code}\n```\n\n"
+            parts.append(f"### Code\n\n```{lang}\n{code}\n```\n\n")
 
         # Edge Cases
         edge_cases = self._safe_list(sol, "edge_cases")
         if edge_cases:
-            md += "### Edge Cases\n\n"
-            for ec in edge_cases:
-                md += f"- {ec}\n"
-            md += "\n"
+            parts.append("### Edge Cases\n\n")
+            parts.append("".join(f"- {ec}\n" for ec in edge_cases))
+            parts.append("\n")
 
         # Complexity
         tc = sol.get("time_complexity")
         sc = sol.get("space_complexity")
         if tc or sc:
-            md += "### Complexity\n\n"
+            parts.append("### Complexity\n\n")
             if tc:
-                md += f"**Time:** {tc}\n\n"
+                parts.append(f"**Time:** {tc}\n\n")
             if sc:
-                md += f"**Space:** {sc}\n\n"
+                parts.append(f"**Space:** {sc}\n\n")
 
-        return md.strip()
+        return "".join(parts).strip()
 
     # ── Multiple Choice Formatter ───────────────────────────────
 
     def _fmt_multiple_choice(self, sol: Dict, info: Dict) -> str:
-        md = "**Type:** `MULTIPLE CHOICE`\n\n"
+        parts: List[str] = ["**Type:** `MULTIPLE CHOICE`\n\n"]
 
         letter = sol.get("option_letter", "?")
         selected = sol.get("selected_option", "")
-        md += f"### Answer: **{letter}**\n\n"
+        parts.append(f"### Answer: **{letter}**\n\n")
         if selected:
-            md += f"> {selected}\n\n"
+            parts.append(f"> {selected}\n\n")
 
         # Show all options if available
         all_opts = sol.get("all_options", {})
         if all_opts and isinstance(all_opts, dict):
-            md += "### Options\n\n"
+            parts.append("### Options\n\n")
+            chosen = str(letter).upper()
             for key in sorted(all_opts.keys()):
-                marker = "✅" if str(key).upper() == str(letter).upper() else "⬚"
-                md += f"{marker} **{key}.** {all_opts[key]}\n\n"
+                marker = "✅" if str(key).upper() == chosen else "⬚"
+                parts.append(f"{marker} **{key}.** {all_opts[key]}\n\n")
 
         explanation = sol.get("explanation", "")
         if explanation:
-            md += f"### Explanation\n\n{explanation}\n\n"
+            parts.append(f"### Explanation\n\n{explanation}\n\n")
 
-        return md.strip()
+        return "".join(parts).strip()
 
     # ── Math Formatter ──────────────────────────────────────────
 
     def _fmt_math(self, sol: Dict, info: Dict) -> str:
-        md = "**Type:** `MATH`\n\n"
+        parts: List[str] = ["**Type:** `MATH`\n\n"]
 
         # Step-by-step
         steps = self._safe_list(sol, "step_by_step")
         if steps:
-            md += "### Step-by-Step Solution\n\n"
-            for i, step in enumerate(steps, 1):
-                md += f"**{i}.** {step}<br>\n"
-            md += "\n"
+            parts.append("### Step-by-Step Solution\n\n")
+            parts.append("".join(f"**{i}.** {step}<br>\n" for i, step in enumerate(steps, 1)))
+            parts.append("\n")
 
         # Final answer (highlighted)
         answer = sol.get("final_answer", "")
         if answer:
-            md += f"### Final Answer\n\n**{answer}**\n\n"
+            parts.append(f"### Final Answer\n\n**{answer}**\n\n")
 
         # Formula
         formula = sol.get("formula_used", "")
         if formula:
-            md += f"### Formula Used\n\n{formula}\n\n"
+            parts.append(f"### Formula Used\n\n{formula}\n\n")
 
-        return md.strip()
+        return "".join(parts).strip()
 
     # ── General Formatter ───────────────────────────────────────
 
     def _fmt_general(self, sol: Dict, info: Dict) -> str:
         ptype = info.get("problem_type", "general").upper()
-        md = f"**Type:** `{ptype}`\n\n"
+        parts: List[str] = [f"**Type:** `{ptype}`\n\n"]
 
         reasoning = sol.get("reasoning", "")
         answer = sol.get("answer", "")
 
         if reasoning:
-            md += f"### Analysis\n\n{reasoning}\n\n"
+            parts.append(f"### Analysis\n\n{reasoning}\n\n")
         if answer:
-            md += f"### Answer\n\n{answer}\n\n"
+            parts.append(f"### Answer\n\n{answer}\n\n")
 
-        return md.strip()
+        return "".join(parts).strip()
 
     # ── Raw Fallback ────────────────────────────────────────────
 
     def _format_raw_fallback(self, data: Dict, ptype: str) -> str:
         """Last-resort renderer — always shows *something* useful."""
-        logger.debug(f"Raw fallback triggered for type={ptype}")
-        md = f"**Type:** `{ptype.upper()}`\n\n"
-        md += "### Response\n\n"
+        logger.debug("Raw fallback triggered for type=%s", ptype)
+        header = f"**Type:** `{ptype.upper()}`\n\n### Response\n\n"
 
         # Try to extract any text-like value
         if isinstance(data, dict):
             for key in ("solution", "answer", "response", "text", "raw"):
                 val = data.get(key)
                 if val and isinstance(val, str):
-                    md += val + "\n\n"
-                    return md.strip()
+                    return f"{header}{val}".strip()
                 elif val and isinstance(val, dict):
                     # Dump the dict in a readable way
-                    md += "```json\n" + json.dumps(val, indent=2, default=str) + "\n```\n\n"
-                    return md.strip()
+                    return f"{header}```json\n{json.dumps(val, indent=2, default=str)}\n```".strip()
 
-        md += "```json\n" + json.dumps(data, indent=2, default=str) + "\n```\n\n"
-        return md.strip()
+        return f"{header}```json\n{json.dumps(data, indent=2, default=str)}\n```".strip()
 
     # ── Helpers ─────────────────────────────────────────────────
 
@@ -504,7 +1033,7 @@ Solve the problem shown in the image. Use the classification context above to fo
         combined = " ".join(str(s) for s in raw) if isinstance(raw, list) else str(raw)
 
         # Try to split on numbered patterns like "1. ", "2) ", "Step 3:"
-        parts = re.split(r'(?:^|\s)(?:\d+[\.\)]\s+|Step\s+\d+[:\s])', combined)
+        parts = _STEP_MARKER.split(combined)
         parts = [p.strip() for p in parts if p.strip()]
 
         # If splitting didn't help, keep the original as a single item
@@ -514,7 +1043,7 @@ Solve the problem shown in the image. Use the classification context above to fo
         # Clean leading bullets/dashes
         cleaned = []
         for p in parts:
-            p = re.sub(r'^[\-\*•]\s*', '', p).strip()
+            p = _LEADING_BULLET.sub('', p).strip()
             if p:
                 cleaned.append(p)
 
@@ -534,8 +1063,8 @@ Solve the problem shown in the image. Use the classification context above to fo
         code = code.strip()
 
         # Remove wrapping ```lang ... ``` blocks
-        code = re.sub(r'^```\w*\n?', '', code)
-        code = re.sub(r'\n?```$', '', code)
+        code = _CODE_FENCE_OPEN.sub('', code)
+        code = _CODE_FENCE_CLOSE.sub('', code)
 
         # Normalize escaped newlines (LLM sometimes returns literal \\n)
         code = code.replace('\\n', '\n')
@@ -5,57 +5,65 @@ Utilities for encoding data in TOON format for efficient LLM token usage.
 TOON achieves 30-60% token reduction compared to JSON for LLM prompts.
 """
 
+import functools
 import json
 import logging
 from typing import Any, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
-_toon_available: Optional[bool] = None  # cached after first check
+try:
+    from toon_format import encode as _toon_encode, decode as _toon_decode
+    _HAS_TOON = True
+except ImportError:
+    _toon_encode = _toon_decode = None
+    _HAS_TOON = False
+
+ENCODE_CACHE_SIZE = 256
+
+# JSON fallback is LLM input: whitespace only costs prompt tokens
+_COMPACT = dict(separators=(",", ":"), ensure_ascii=False, default=str)
+_PRETTY = dict(indent=2, ensure_ascii=False, default=str)
+
+
+def _json_fallback(data: Any, debug: bool = False) -> str:
+    """JSON stand-in for TOON; pretty-printed only when debug=True."""
+    return json.dumps(data, **(_PRETTY if debug else _COMPACT))
 
 
 def is_toon_available() -> bool:
     """Check whether the toon-format package is installed."""
-    global _toon_available
-    if _toon_available is None:
-        try:
-            import toon_format  # noqa: F401
-            _toon_available = True
-        except ImportError:
-            _toon_available = False
-    return _toon_available
+    return _HAS_TOON
 
 
-def encode_toon(data: Any) -> str:
+def encode_toon(data: Any, debug: bool = False) -> str:
     """
     Encode data to TOON format.
     Falls back to JSON if toon-format package is not available or encoding fails.
     """
+    if not _HAS_TOON:
+        logger.debug("toon-format package not available, utilizing JSON fallback.")
+        return _json_fallback(data, debug)
     try:
-        from toon_format import encode
-        result = encode(data)
-        logger.debug(f"TOON encoded ({len(result)} chars)")
+        result = _toon_encode(data)
+        logger.debug("TOON encoded (%s chars)", len(result))
         return result
-    except ImportError:
-        logger.debug("toon-format package not available, utilizing JSON fallback.")
-        return json.dumps(data, indent=2)
     except Exception as e:
-        logger.error(f"TOON encoding error: {e}. Falling back to JSON.")
-        return json.dumps(data, indent=2)
+        logger.error("TOON encoding error: %s. Falling back to JSON.", e)
+        return _json_fallback(data, debug)
 
 
 def decode_toon(toon_str: str) -> Any:
     """
     Decode TOON format string to Python data.
     """
-    try:
-        from toon_format import decode
-        return decode(toon_str)
-    except ImportError:
+    if not _HAS_TOON:
         logger.debug("toon-format package not available, utilizing JSON fallback.")
         return json.loads(toon_str)
+    try:
+        return _toon_decode(toon_str)
     except Exception as e:
-        logger.error(f"TOON decoding error: {e}")
+        logger.error("TOON decoding error: %s", e)
         return None
 
 
@@ -100,10 +108,13 @@ def encode_problem_context(problem_info: Dict[str, Any], problem_type: str) -> s
     return encode_toon(context)
 
 
+@functools.lru_cache(maxsize=ENCODE_CACHE_SIZE)
 def encode_extraction_hints(user_prompt: str) -> str:
     """
     Encode the extraction task instructions in TOON format for Step 1.
     Provides structured hints to the classifier about what to look for.
+    Everything but user_prompt is static, so the result is memoized on that
+    string (retries, fallbacks and batch items reuse the same prompt).
     """
     hints = {
         "task": "classify_and_extract",
@@ -122,10 +133,49 @@ def encode_extraction_hints(user_prompt: str) -> str:
     return encode_toon(hints)
 
 
-def format_context_toon(context: Dict[str, Any]) -> str:
+# A lone message up to this length is inlined as plain text instead of TOON
+SMALL_MESSAGE_CHARS = 200
+
+
+def _is_trivial(context: Optional[Dict[str, Any]]) -> bool:
+    """True when the context carries no messages and no files."""
+    return not context or (not context.get("messages") and not context.get("files"))
+
+
+def _inline_message(message: Any) -> Optional[str]:
+    """Plain-text form of a single small message, or None if it needs TOON."""
+    if isinstance(message, dict):
+        content = message.get("content")
+        if not isinstance(content, str) or len(message.keys() - {"role", "content"}):
+            return None
+        text = f"{message.get('role', 'user')}: {content}"
+    elif isinstance(message, str):
+        text = message
+    else:
+        return None
+    return text if len(text) <= SMALL_MESSAGE_CHARS else None
+
+
+def _single_inline(context: Dict[str, Any]) -> Optional[str]:
+    """Inline text when the context is exactly one small message and no files."""
+    messages = context.get("messages") or []
+    if len(messages) == 1 and not context.get("files"):
+        return _inline_message(messages[0])
+    return None
+
+
+def format_context_toon(context: Dict[str, Any], debug: bool = False) -> str:
     """
     Format conversation context in TOON for efficient LLM prompts.
+    Returns "" for an empty context and plain text for one small message.
     """
+    if _is_trivial(context):
+        return ""
+
+    inline = _single_inline(context)
+    if inline is not None:
+        return inline
+
     try:
         formatted_context = {
             "conversation": {
@@ -138,26 +188,32 @@ def format_context_toon(context: Dict[str, Any]) -> str:
                 "user_id": context.get("user_id", "default")
             }
         }
-        return encode_toon(formatted_context)
+        return encode_toon(formatted_context, debug)
     except Exception as e:
-        logger.error(f"Context formatting error: {e}")
-        return json.dumps(context, indent=2)
+        logger.error("Context formatting error: %s", e)
+        return _json_fallback(context, debug)
 
 
 def create_llm_prompt_with_context(
     user_message: str,
     context: Optional[Dict[str, Any]] = None,
-    use_toon: bool = True
+    use_toon: bool = True,
+    debug: bool = False
 ) -> str:
     """
     Create an LLM prompt with optional context in TOON format.
     """
-    if not context:
+    if _is_trivial(context):
         return user_message
 
     if use_toon:
-        context_str = format_context_toon(context)
+        inline = _single_inline(context)
+        if inline is not None:
+            return f"Context:\n{inline}\n\nUser Message: {user_message}"
+        context_str = format_context_toon(context, debug)
+        if not context_str:
+            return user_message
         return f"Context (TOON format):\n{context_str}\n\nUser Message: {user_message}"
 
-    context_str = json.dumps(context, indent=2)
+    context_str = _json_fallback(context, debug)
     return f"Context (JSON format):\n{context_str}\n\nUser Message: {user_message}"
\ No newline at end of file
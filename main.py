@@ -2,9 +2,6 @@
 import sys
 import signal
 import logging
-from PySide6.QtWidgets import QApplication
-from PySide6.QtCore import Qt
-from ui.main_window import MainWindow
 
 
 def _setup_logging():
@@ -50,7 +47,13 @@ def main():
     # Allow Ctrl+C to exit the app from terminal
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
+    # Qt and the window stack are imported here rather than at module top so
+    # the logging setup above runs before the heavy extension modules load
+    from PySide6.QtWidgets import QApplication
+
     try:
+        from ui.main_window import MainWindow
+
         # Create application
         app = QApplication(sys.argv)
         app.setApplicationName("Privacy LLM Assistant")
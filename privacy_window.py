@@ -1,7 +1,11 @@
 import tkinter as tk
 import ctypes
+import logging
+import sys
 from ctypes import wintypes
 
+logger = logging.getLogger(__name__)
+
 # Windows API Constants
 WDA_NONE = 0x00000000
 WDA_MONITOR = 0x00000001
@@ -11,44 +15,61 @@ GWL_EXSTYLE = -20
 WS_EX_TOOLWINDOW = 0x00000080
 WS_EX_APPWINDOW = 0x00040000
 
-def set_window_privacy(hwnd):
+# Resolve the user32 entry points once, with explicit signatures so ctypes
+# skips per-call argument inference. use_last_error makes
+# ctypes.get_last_error() report the real failure code.
+if sys.platform == "win32":
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+
+    _SetWindowDisplayAffinity = _user32.SetWindowDisplayAffinity
+    _SetWindowDisplayAffinity.argtypes = [wintypes.HWND, wintypes.DWORD]
+    _SetWindowDisplayAffinity.restype = wintypes.BOOL
+
+    _GetWindowLongW = _user32.GetWindowLongW
+    _GetWindowLongW.argtypes = [wintypes.HWND, ctypes.c_int]
+    _GetWindowLongW.restype = wintypes.LONG
+
+    _SetWindowLongW = _user32.SetWindowLongW
+    _SetWindowLongW.argtypes = [wintypes.HWND, ctypes.c_int, wintypes.LONG]
+    _SetWindowLongW.restype = wintypes.LONG
+
+    _GetParent = _user32.GetParent
+    _GetParent.argtypes = [wintypes.HWND]
+    _GetParent.restype = wintypes.HWND
+
+def set_window_privacy(hwnd) -> bool:
     """
     Sets the window display affinity to exclude it from capture.
     """
     try:
-        user32 = ctypes.windll.user32
-        result = user32.SetWindowDisplayAffinity(hwnd, WDA_EXCLUDEFROMCAPTURE)
-        if result == 0:
-            print(f"Failed to set display affinity. Error: {ctypes.get_last_error()}")
-        else:
-            print("Successfully set window privacy (WDA_EXCLUDEFROMCAPTURE).")
+        if _SetWindowDisplayAffinity(hwnd, WDA_EXCLUDEFROMCAPTURE):
+            return True
+        logger.warning("Failed to set display affinity. Error: %s", ctypes.get_last_error())
     except Exception as e:
-        print(f"Error setting window privacy: {e}")
+        logger.error("Error setting window privacy: %s", e)
+    return False
 
-def set_stealth_mode(hwnd):
+def set_stealth_mode(hwnd) -> bool:
     """
     Sets extended window styles to hide from Taskbar and Alt-Tab.
     """
     try:
-        user32 = ctypes.windll.user32
-        
         # Get current extended style
-        style = user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
-        
+        style = _GetWindowLongW(hwnd, GWL_EXSTYLE)
+
         # Add TOOLWINDOW style, Remove APPWINDOW style
         # WS_EX_TOOLWINDOW: Hides from Alt-Tab and Taskbar (usually)
         new_style = (style | WS_EX_TOOLWINDOW) & ~WS_EX_APPWINDOW
-        
-        result = user32.SetWindowLongW(hwnd, GWL_EXSTYLE, new_style)
-        if result == 0:
-            print(f"Failed to set stealth mode. Error: {ctypes.get_last_error()}")
-        else:
-            print("Successfully set stealth mode (WS_EX_TOOLWINDOW).")
-            
+
+        if _SetWindowLongW(hwnd, GWL_EXSTYLE, new_style):
+            return True
+        logger.warning("Failed to set stealth mode. Error: %s", ctypes.get_last_error())
     except Exception as e:
-        print(f"Error setting stealth mode: {e}")
+        logger.error("Error setting stealth mode: %s", e)
+    return False
 
 def main():
+    logging.basicConfig(level=logging.WARNING)
     root = tk.Tk()
     root.title("Privacy Protected Window")
     root.geometry("400x200")
@@ -97,11 +118,11 @@ def main():
     root.update()
     
     # Get window handle - For overrideredirect windows, we might need the parent or wrapper
-    hwnd = ctypes.windll.user32.GetParent(root.winfo_id())
+    hwnd = _GetParent(root.winfo_id())
     if not hwnd:
         hwnd = root.winfo_id()
         
-    print(f"Window Handle: {hwnd}")
+    logger.debug("Window Handle: %s", hwnd)
     
     set_window_privacy(hwnd)
     set_stealth_mode(hwnd)
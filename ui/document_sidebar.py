@@ -6,11 +6,74 @@ Supports: PDF, TXT, DOCX, MD files
 """
 
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QTextBrowser, QLabel,
-    QPushButton, QFileDialog, QHBoxLayout
+    QApplication, QWidget, QVBoxLayout, QTextBrowser, QLabel,
+    QPushButton, QHBoxLayout
 )
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QObject, QRunnable, QThreadPool
+from collections import OrderedDict
+import functools
+import logging
 import os
+import threading
+
+# Only stdlib at import time; the parsers load on the first read
+from utils.file_handler import SUPPORTED_DOCUMENT_EXTS, validate_file_type
+
+logger = logging.getLogger(__name__)
+
+# Parsed documents kept around so reopening one skips the parse
+DOCUMENT_CACHE_SIZE = 8
+
+_doc_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_doc_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _document_reader():
+    """Import the document parsers on first use and keep the bound reader."""
+    from utils.file_handler import read_document
+    return read_document
+
+
+def _read_document_cached(file_path: str) -> str:
+    """read_document with an LRU keyed on (path, mtime, size)."""
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    with _doc_cache_lock:
+        content = _doc_cache.get(key)
+        if content is not None:
+            _doc_cache.move_to_end(key)
+            return content
+
+    content = _document_reader()(file_path)
+
+    with _doc_cache_lock:
+        _doc_cache[key] = content
+        while len(_doc_cache) > DOCUMENT_CACHE_SIZE:
+            _doc_cache.popitem(last=False)
+    return content
+
+
+class _LoadSignals(QObject):
+    loaded = Signal(str, str)  # path, content
+    failed = Signal(str, str)  # path, error message
+
+
+class _LoadWorker(QRunnable):
+    """Parses a document on the thread pool and reports back via signals."""
+
+    def __init__(self, file_path: str):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = _LoadSignals()
+
+    def run(self):
+        try:
+            content = _read_document_cached(self.file_path)
+        except Exception as e:
+            self.signals.failed.emit(self.file_path, str(e))
+            return
+        self.signals.loaded.emit(self.file_path, content)
 
 
 class DocumentSidebar(QWidget):
@@ -22,6 +85,10 @@ class DocumentSidebar(QWidget):
         super().__init__()
         self.setFixedWidth(300)
         self._current_file = None
+        self._pending_file = None
+        self._load_worker = None
+        self._file_dialog = None  # created on first use, then reused
+        self._last_dir = ""
         self._setup_ui()
         
         # Enable drag and drop
@@ -82,49 +149,89 @@ class DocumentSidebar(QWidget):
         
         layout.addLayout(controls_layout)
     
+    @staticmethod
+    def _supported_files(mime_data):
+        """Local file paths in the drag payload that read_document can parse."""
+        if not mime_data.hasUrls():
+            return []
+        return [
+            path for path in (u.toLocalFile() for u in mime_data.urls())
+            if path and validate_file_type(path, SUPPORTED_DOCUMENT_EXTS)
+        ]
+
     def dragEnterEvent(self, event):
-        if event.mimeData().hasUrls():
+        if self._supported_files(event.mimeData()):
             event.accept()
         else:
             event.ignore()
-            
+
     def dropEvent(self, event):
-        files = [u.toLocalFile() for u in event.mimeData().urls()]
+        files = self._supported_files(event.mimeData())
         if files:
             self.load_document(files[0])
-    
+
     def _open_file(self):
         """Open file dialog to load document"""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Open Document",
-            "",
-            "Documents (*.pdf *.txt *.docx *.md);;All Files (*.*)"
-        )
-        if file_path:
-            self.load_document(file_path)
+        if self._file_dialog is None:
+            from PySide6.QtWidgets import QFileDialog
+            dialog = QFileDialog(self, "Open Document")
+            dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
+            dialog.setNameFilters(["Documents (*.pdf *.txt *.docx *.md)", "All Files (*.*)"])
+            self._file_dialog = dialog
+
+        if self._last_dir:
+            self._file_dialog.setDirectory(self._last_dir)
+        if self._file_dialog.exec():
+            files = self._file_dialog.selectedFiles()
+            if files:
+                self._last_dir = os.path.dirname(files[0])
+                self.load_document(files[0])
     
     def load_document(self, file_path: str):
-        """Load and display a document"""
-        try:
-            from utils.file_handler import read_document
-            content = read_document(file_path)
-            
-            self.doc_viewer.setPlainText(content)
-            self._current_file = file_path
-            
-            # Update UI
-            filename = os.path.basename(file_path)
-            self.file_label.setText(f"📄 {filename}")
-            self.file_label.setStyleSheet("color: #4682d4; font-weight: bold;")
-            self.close_btn.setVisible(True)
-            
-            self.document_loaded.emit(file_path)
-            print(f"Loaded document: {filename}")
-        except Exception as e:
-            self.doc_viewer.setPlainText(f"Error loading document:\n{str(e)}")
-            print(f"Error loading document: {e}")
-    
+        """Load and display a document (parsed off the UI thread)"""
+        if self._pending_file is None:
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        self._pending_file = file_path
+
+        worker = _LoadWorker(file_path)
+        worker.signals.loaded.connect(self._on_loaded)
+        worker.signals.failed.connect(self._on_failed)
+        # Keep the signal holder alive until its queued emit is delivered
+        self._load_worker = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def _finish_load(self, file_path: str) -> bool:
+        """Clear the busy state; False if a newer load superseded this one."""
+        if file_path != self._pending_file:
+            return False
+        self._pending_file = None
+        self._load_worker = None
+        QApplication.restoreOverrideCursor()
+        return True
+
+    def _on_loaded(self, file_path: str, content: str):
+        if not self._finish_load(file_path):
+            return
+
+        self.doc_viewer.setPlainText(content)
+        self._current_file = file_path
+
+        # Update UI
+        filename = os.path.basename(file_path)
+        self.file_label.setText(f"📄 {filename}")
+        self.file_label.setStyleSheet("color: #4682d4; font-weight: bold;")
+        self.close_btn.setVisible(True)
+
+        self.document_loaded.emit(file_path)
+        logger.info("Loaded document: %s", filename)
+
+    def _on_failed(self, file_path: str, error: str):
+        if not self._finish_load(file_path):
+            return
+
+        self.doc_viewer.setPlainText(f"Error loading document:\n{error}")
+        logger.warning("Error loading document: %s", error)
+
     def _close_document(self):
         """Close the current document"""
         self.doc_viewer.clear()
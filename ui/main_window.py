@@ -9,19 +9,23 @@ Combines all UI components into the main application window with:
 """
 
 import logging
+import math
+import sys
 import time
 from PySide6.QtWidgets import (
-    QHBoxLayout, QVBoxLayout, QLabel, QWidget, QMessageBox, QInputDialog,
+    QVBoxLayout, QLabel, QWidget, QMessageBox, QInputDialog,
     QTextBrowser, QSizePolicy, QLineEdit
 )
-from PySide6.QtCore import Qt, QSize
-from PySide6.QtGui import QKeySequence, QShortcut, QPalette, QColor, QDesktopServices
+from PySide6.QtCore import Qt, QSize, Signal, QObject, QRunnable, QThreadPool, QTimer
+from PySide6.QtGui import QKeySequence, QShortcut, QPalette, QColor, QDesktopServices, QTextCursor
 import ctypes
-import markdown
-from pygments.formatters import HtmlFormatter
+import functools
+import threading
+from collections import OrderedDict
 from ctypes import wintypes
-from ui.privacy_window import PrivacyWindow
+from ui.privacy_window import PrivacyWindow, WDA_EXCLUDEFROMCAPTURE
 from config.settings import Settings
+from llm.base_provider import DEFAULT_MAX_IMAGE_EDGE
 from llm.gemini_provider import GeminiProvider
 from llm.smart_provider import SmartGeminiProvider
 from llm.claude_provider import ClaudeProvider
@@ -39,10 +43,292 @@ _SBP = Qt.ScrollBarPolicy
 _TM  = Qt.TransformationMode
 _CR  = QPalette.ColorRole
 
+# Hotkey entry points resolved once with explicit signatures, on a private
+# WinDLL so the argtypes don't leak into other users of ctypes.windll
+if sys.platform == "win32":
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+
+    _RegisterHotKey = _user32.RegisterHotKey
+    _RegisterHotKey.argtypes = [wintypes.HWND, ctypes.c_int, wintypes.UINT, wintypes.UINT]
+    _RegisterHotKey.restype = wintypes.BOOL
+
+    _UnregisterHotKey = _user32.UnregisterHotKey
+    _UnregisterHotKey.argtypes = [wintypes.HWND, ctypes.c_int]
+    _UnregisterHotKey.restype = wintypes.BOOL
+
+# Overlay geometry
+_TOAST_ORIGIN = (20, 50)   # top-left corner the overlay starts at and resets to
+_MIN_SIZE     = (280, 60)  # collapsed "Listening..." size
+_OVERHEAD_PX  = 60         # legend bar + layout margins around the document
+_TEXT_PAD_PX  = 40         # horizontal margins between window and text
+
+_WM_HOTKEY = 0x0312
+_MSG_MESSAGE_OFFSET = wintypes.MSG.message.offset
+_MSG_WPARAM_OFFSET = wintypes.MSG.wParam.offset
+
+
+# Static part of the response stylesheet; the pygments rules are appended once
+# the formatter exists
+_HTML_CSS = """
+        body { font-family: 'Segoe UI', sans-serif; color: #e0e0e0; margin: 0; }
+        p { margin-bottom: 10px; margin-top: 0; }
+        a { color: #4facfe; }
+        pre {
+            background-color: #272822;
+            padding: 12px;
+            border-radius: 6px;
+            border: 1px solid #444;
+            overflow-x: auto;
+            margin: 8px 0;
+            line-height: 1.2;
+        }
+        pre * { margin: 0; padding: 0; }
+        code { font-family: 'Consolas', 'Monaco', monospace; font-size: 13px; }
+        p code { background-color: #3e3e3e; padding: 2px 5px; border-radius: 4px; }
+        table { border-collapse: collapse; margin: 8px 0; }
+        th, td { border: 1px solid #444; padding: 4px 8px; }
+        th { background-color: #2b2b2b; }
+"""
+
+
+@functools.lru_cache(maxsize=64)
+def _lexer_for(lang: str):
+    """
+    Pygments lexer for a fence language, built once per name. Resolving a
+    name walks pygments' lexer registry and instantiates the class; replies
+    repeat the same few languages, so the instances are reused.
+    """
+    from pygments.lexers import get_lexer_by_name
+    from pygments.lexers.special import TextLexer
+    from pygments.util import ClassNotFound
+    if lang:
+        try:
+            return get_lexer_by_name(lang)
+        except ClassNotFound:
+            pass
+    return TextLexer()
+
+
+@functools.lru_cache(maxsize=None)
+def _code_formatter():
+    """
+    The one monokai HtmlFormatter, emitting only the inline-styled spans for
+    fence bodies. Building a formatter resolves the style's token table, so
+    every code block and the stylesheet share this instance.
+    """
+    from pygments.formatters import HtmlFormatter
+    return HtmlFormatter(style='monokai', noclasses=True, nowrap=True)
+
+
+@functools.lru_cache(maxsize=None)
+def _response_css() -> str:
+    """
+    Full reply stylesheet (static rules + monokai defs), computed once per
+    process and shared by every viewer.
+    """
+    return _HTML_CSS + _code_formatter().get_style_defs('.codehilite')
+
+
+@functools.lru_cache(maxsize=None)
+def _markdown_renderer():
+    """
+    Import markdown-it and pygments on the first render (on the send worker)
+    rather than at startup, and build the shared parser.
+    Deterministic, so built once instead of per response.
+    """
+    from markdown_it import MarkdownIt
+    from pygments import highlight
+
+    code_formatter = _code_formatter()
+
+    def highlight_fence(code: str, lang: str, attrs: str) -> str:
+        """markdown-it highlight hook: pygments-colour a fenced block."""
+        lexer = _lexer_for(lang.lower())
+        # Starting with <pre tells markdown-it to use the block as-is
+        return f'<pre class="codehilite"><code>{highlight(code, lexer, code_formatter)}</code></pre>'
+
+    # Bare URLs become links only when linkify-it-py is installed
+    try:
+        import linkify_it  # noqa: F401
+        linkify = True
+    except ImportError:
+        linkify = False
+
+    # One parser, reused by every render; raw HTML in replies is escaped.
+    # GFM tables and ~~strikethrough~~ are common in model output
+    md = MarkdownIt(
+        "commonmark", {"html": False, "linkify": linkify, "highlight": highlight_fence}
+    ).enable(["table", "strikethrough"])
+    if linkify:
+        md.enable("linkify")
+    # Warm the stylesheet here too, so the GUI thread finds it computed
+    _response_css()
+    return md
+
+
+# Rendered replies kept so showing the same text again skips the parse
+RENDER_CACHE_SIZE = 32
+
+_render_cache: "OrderedDict[str, str]" = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+def _render_markdown_to_html(md_text: str) -> str:
+    """
+    Convert markdown text to HTML for the response viewer (LRU-cached).
+    Carries no <style> block: the viewer's document has _response_css()
+    installed as its default stylesheet.
+    """
+    with _render_cache_lock:
+        cached = _render_cache.get(md_text)
+        if cached is not None:
+            _render_cache.move_to_end(md_text)
+            return cached
+
+    try:
+        html_content = _markdown_renderer().render(md_text)
+    except Exception as e:
+        logger.warning("Markdown rendering failed, using plain text: %s", e)
+        # Escape HTML and preserve newlines  
+        import html
+        # Not cached: a later call may succeed once the renderer imports
+        return html.escape(md_text).replace('\n', '<br>')
+
+    with _render_cache_lock:
+        _render_cache[md_text] = html_content
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return html_content
+
+
+_WINDOW_STYLE = """
+    QToolTip {
+        color: #ffffff;
+        background-color: #2a82da;
+        border: 1px solid white;
+    }
+    QWidget {
+        font-family: 'Segoe UI', sans-serif;
+    }
+    QWidget#container {
+        background-color: rgba(30, 30, 30, 240);
+        border: 1px solid rgba(255, 255, 255, 30);
+        border-radius: 10px;
+    }
+    QWidget#legend { background: transparent; }
+    QWidget#legend QLabel { font-size: 9px; margin: 0px; padding: 0px; }
+    QLabel#imagePreview {
+        background: transparent;
+        border: 1px solid #444;
+        border-radius: 4px;
+    }
+    QTextBrowser#responseViewer {
+        color: #e0e0e0;
+        font-size: 14px;
+        background: transparent;
+        border: none;
+    }
+    QLabel#statusDot {
+        font-size: 8px;
+        background: transparent;
+        padding: 2px;
+    }
+    QLabel#statusDot[privacy="on"]  { color: #00ffca; }
+    QLabel#statusDot[privacy="off"] { color: #ff4444; }
+"""
+
+
+class _SendSignals(QObject):
+    chunk = Signal(str)            # streamed plain text since the last chunk
+    finished = Signal(str, float)  # rendered HTML, elapsed seconds
+    failed = Signal(str, float)    # error message, elapsed seconds
+
+
+class _SendWorker(QRunnable):
+    """
+    Runs the LLM request and the markdown/pygments render on the thread pool,
+    so only the final setHtml happens on the GUI thread. When streaming,
+    text is forwarded in batches while the reply is still arriving.
+    """
+
+    # Streamed tokens are batched so the GUI thread gets a handful of
+    # appends per second rather than one per token
+    STREAM_FLUSH_S = 0.15
+
+    def __init__(self, provider, image, stream: bool = False):
+        super().__init__()
+        self.provider = provider
+        self.image = image
+        self.stream = stream
+        self.signals = _SendSignals()
+
+    def _stream(self, text: str) -> dict:
+        """Stream the reply, emitting batched chunks; returns the full response dict."""
+        pending = []
+        last_flush = time.monotonic()
+
+        def on_token(chunk: str):
+            nonlocal last_flush
+            pending.append(chunk)
+            now = time.monotonic()
+            if now - last_flush >= self.STREAM_FLUSH_S:
+                self.signals.chunk.emit("".join(pending))
+                pending.clear()
+                last_flush = now
+
+        # The smart provider classifies first and then streams its solution
+        if hasattr(self.provider, 'send_message_stream'):
+            return self.provider.send_message_stream(
+                text=text, images=[self.image], on_token=on_token
+            )
+
+        chunks = []
+        for chunk in self.provider.stream_response(text, images=[self.image]):
+            chunks.append(chunk)
+            on_token(chunk)
+        return {'response': "".join(chunks)}
+
+    def run(self):
+        send_start = time.time()
+        try:
+            logger.info("Sending image to LLM provider...")
+            if self.stream:
+                response = self._stream("Analyze this image.")
+            else:
+                response = self.provider.send_message(
+                    text="Analyze this image.",
+                    images=[self.image]
+                )
+            elapsed = time.time() - send_start
+            logger.info("LLM response received in %.1fs", elapsed)
+
+            text_response = response.get('response', 'No response')
+
+            # Log metadata if available
+            metadata = response.get('metadata', {})
+            if metadata:
+                logger.debug("Response metadata: model=%s, timing=%s", metadata.get('model'), metadata.get('timing'))
+
+            reply_html = _render_markdown_to_html(text_response)
+        except Exception as e:
+            elapsed = time.time() - send_start
+            logger.error("LLM send failed after %.1fs: %s", elapsed, e, exc_info=True)
+            self.signals.failed.emit(str(e), elapsed)
+            return
+        self.signals.finished.emit(reply_html, time.time() - send_start)
+
 
 class MainWindow(PrivacyWindow):
     """Main application window combining all UI components"""
 
+    # Time for the compositor to drop the hidden overlay from the screen before
+    # capturing; waited on a timer, so hotkeys and painting keep running
+    CAPTURE_SETTLE_MS = 50
+
+    # The screenshot preview only confirms what was just captured, so colour is
+    # decorative; grayscale keeps the pixmap at 8 bpp
+    PREVIEW_GRAYSCALE = True
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Privacy LLM Assistant")
@@ -62,7 +348,7 @@ class MainWindow(PrivacyWindow):
         self.set_click_through(True)
 
         # 3. Start small; expand once content is ready
-        self.resize(280, 60)
+        self.resize(*_MIN_SIZE)
 
         # Load settings
         self.settings = Settings()
@@ -72,8 +358,26 @@ class MainWindow(PrivacyWindow):
 
         # Initialize LLM provider
         self.llm_provider = None
+        self._send_signals = None  # in-flight _SendWorker's signal holder
+        self._stream_cursor = None  # append position of the reply being streamed
+        self._response_css_installed = False  # set on the first rendered reply
+        self._shown_html = None  # last HTML given to _show_html, None once the text changes otherwise
+        self._capture_pending = False  # screenshot waiting on CAPTURE_SETTLE_MS
         self._init_llm_provider()
 
+        # Every content change schedules the fit through this one timer;
+        # restarting it coalesces back-to-back requests into a single layout
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.timeout.connect(self.adjust_height_to_content)
+
+        # Ctrl+Arrow moves are applied at most once per ~16 ms frame
+        self._pending_dx = self._pending_dy = 0
+        self._move_timer = QTimer(self)
+        self._move_timer.setSingleShot(True)
+        self._move_timer.setInterval(16)
+        self._move_timer.timeout.connect(self._flush_move)
+
         self._position_toast()
         self._apply_dark_theme()
         self._setup_ui()
@@ -90,7 +394,7 @@ class MainWindow(PrivacyWindow):
 
     def _position_toast(self):
         """Position window in top-left corner"""
-        self.move(20, 50)
+        self.move(*_TOAST_ORIGIN)
 
     # ------------------------------------------------------------------
     # Resize
@@ -98,14 +402,19 @@ class MainWindow(PrivacyWindow):
 
     def resizeEvent(self, event):
         """Reposition the floating status dot on resize"""
-        if hasattr(self, 'status_label') and self.status_label:
-            container = self.findChild(QWidget, "container")
-            if container:
-                x = container.width() - self.status_label.width() - 10
-                self.status_label.move(x, 5)
-                self.status_label.raise_()
+        self._place_status_label()
         super().resizeEvent(event)
 
+    def _place_status_label(self):
+        # Cached at setup instead of a findChild() tree walk per resize
+        container = getattr(self, '_container', None)
+        if container is None:
+            return
+        x = container.width() - self.status_label.width() - 10
+        if x != self.status_label.x():  # height-only resizes leave it in place
+            self.status_label.move(x, 5)
+            self.status_label.raise_()
+
     # ------------------------------------------------------------------
     # Theme
     # ------------------------------------------------------------------
@@ -128,16 +437,9 @@ class MainWindow(PrivacyWindow):
         palette.setColor(_CR.HighlightedText, QColor(0, 0, 0))
         self.setPalette(palette)
 
-        self.setStyleSheet("""
-            QToolTip {
-                color: #ffffff;
-                background-color: #2a82da;
-                border: 1px solid white;
-            }
-            QWidget {
-                font-family: 'Segoe UI', sans-serif;
-            }
-        """)
+        # The window's single stylesheet: every child is styled from here by
+        # object name, so the style engine parses and polishes the tree once
+        self.setStyleSheet(_WINDOW_STYLE)
 
     # ------------------------------------------------------------------
     # UI Setup
@@ -152,32 +454,18 @@ class MainWindow(PrivacyWindow):
         # Container
         container = QWidget()
         container.setObjectName("container")
+        self._container = container
         container.setAttribute(_WA.WA_StyledBackground, True)
-        container.setStyleSheet("""
-            QWidget#container {
-                background-color: rgba(30, 30, 30, 240);
-                border: 1px solid rgba(255, 255, 255, 30);
-                border-radius: 10px;
-            }
-        """)
         container_layout = QVBoxLayout(container)
         container_layout.setContentsMargins(15, 10, 15, 5)
 
         # 1. Legend bar
         legend_widget = QWidget()
-        legend_widget.setStyleSheet("background: transparent;")
+        legend_widget.setObjectName("legend")
         legend_layout = QVBoxLayout(legend_widget)
         legend_layout.setContentsMargins(0, 0, 0, 0)
         legend_layout.setSpacing(0)
 
-        row1_layout = QHBoxLayout()
-        row1_layout.setSpacing(10)
-        row1_layout.setAlignment(_AF.AlignLeft)
-
-        row2_layout = QHBoxLayout()
-        row2_layout.setSpacing(10)
-        row2_layout.setAlignment(_AF.AlignLeft)
-
         shortcuts = [
             ("Ctrl+H", "Screenshot"),
             ("Ctrl+R", "Reset"),
@@ -186,43 +474,34 @@ class MainWindow(PrivacyWindow):
             ("Ctrl+Arrows", "Move"),
         ]
 
-        for i, (keys, desc) in enumerate(shortcuts):
-            lbl = QLabel(
+        # One rich-text label per row instead of a label per shortcut
+        for row in (shortcuts[:3], shortcuts[3:]):
+            lbl = QLabel(" &nbsp; ".join(
                 f"<span style='color: #4facfe;'><b>{keys}</b></span> "
                 f"<span style='color: #888;'>{desc}</span>"
-            )
-            lbl.setStyleSheet("font-size: 9px; margin: 0px; padding: 0px;")
-            (row1_layout if i < 3 else row2_layout).addWidget(lbl)
+                for keys, desc in row
+            ))
+            lbl.setAlignment(_AF.AlignLeft)
+            legend_layout.addWidget(lbl)
 
-        row1_layout.addStretch()
-        row2_layout.addStretch()
-        legend_layout.addLayout(row1_layout)
-        legend_layout.addLayout(row2_layout)
         container_layout.addWidget(legend_widget)
 
         # 2. Image preview (hidden by default)
         self.image_preview_label = QLabel()
         self.image_preview_label.setAlignment(_AF.AlignCenter)
-        self.image_preview_label.setStyleSheet(
-            "background: transparent; border: 1px solid #444; border-radius: 4px;"
-        )
+        self.image_preview_label.setObjectName("imagePreview")
         self.image_preview_label.hide()
         container_layout.addWidget(self.image_preview_label)
 
         # 3. Response viewer
         self.response_viewer = QTextBrowser()
-        self.response_viewer.setStyleSheet("""
-            QTextBrowser {
-                color: #e0e0e0;
-                font-size: 14px;
-                background: transparent;
-                border: none;
-            }
-        """)
+        self.response_viewer.setObjectName("responseViewer")
         self.response_viewer.setOpenExternalLinks(True)
         self.response_viewer.setVerticalScrollBarPolicy(_SBP.ScrollBarAlwaysOff)
         self.response_viewer.setHorizontalScrollBarPolicy(_SBP.ScrollBarAlwaysOff)
         self.response_viewer.setHtml("Listening...")
+        # Any other write (setText, streamed chunks) invalidates _shown_html
+        self.response_viewer.textChanged.connect(self._forget_shown_html)
         container_layout.addWidget(self.response_viewer)
 
         container_layout.setStretch(0, 0)
@@ -233,9 +512,8 @@ class MainWindow(PrivacyWindow):
 
         # Status dot (floating overlay)
         self.status_label = QLabel("⬤", container)
-        self.status_label.setStyleSheet(
-            "color: #00ffca; font-size: 8px; background: transparent; padding: 2px;"
-        )
+        self.status_label.setObjectName("statusDot")
+        self.status_label.setProperty("privacy", "on")
         self.status_label.adjustSize()
         self.status_label.show()
 
@@ -245,7 +523,8 @@ class MainWindow(PrivacyWindow):
 
     def _setup_global_hotkeys(self):
         """Register global system-wide hotkeys via user32.dll"""
-        self.user32 = ctypes.windll.user32
+        # The native window exists by now and keeps its HWND; query it once
+        self._hwnd = int(self.winId())
 
         MOD_CONTROL = 0x0002
         VK_H, VK_B, VK_P, VK_R   = 0x48, 0x42, 0x50, 0x52
@@ -269,44 +548,45 @@ class MainWindow(PrivacyWindow):
         }
         self.registered_dynamic_ids = set()
 
-        hwnd = int(self.winId())
         for hk_id, (mod, vk, _) in self.hotkeys.items():
-            if self.user32.RegisterHotKey(hwnd, hk_id, mod, vk):
+            if _RegisterHotKey(self._hwnd, hk_id, mod, vk):
                 self.hotkey_ids[hk_id] = self.hotkeys[hk_id][2]
-                logger.debug(f"Registered hotkey ID {hk_id}")
+                logger.debug("Registered hotkey ID %d", hk_id)
             else:
-                logger.warning(f"Failed to register hotkey ID {hk_id}")
+                logger.warning("Failed to register hotkey ID %d", hk_id)
 
     def _register_dynamic_hotkey(self, hk_id):
         if hk_id in self.registered_dynamic_ids or hk_id not in self.dynamic_hotkeys:
             return
         mod, vk, func = self.dynamic_hotkeys[hk_id]
-        if self.user32.RegisterHotKey(int(self.winId()), hk_id, mod, vk):
+        if _RegisterHotKey(self._hwnd, hk_id, mod, vk):
             self.hotkey_ids[hk_id] = func
             self.registered_dynamic_ids.add(hk_id)
-            logger.debug(f"Registered dynamic hotkey ID {hk_id}")
+            logger.debug("Registered dynamic hotkey ID %d", hk_id)
         else:
-            logger.warning(f"Failed to register dynamic hotkey ID {hk_id}")
+            logger.warning("Failed to register dynamic hotkey ID %d", hk_id)
 
     def _unregister_dynamic_hotkey(self, hk_id):
         if hk_id not in self.registered_dynamic_ids:
             return
-        if self.user32.UnregisterHotKey(int(self.winId()), hk_id):
+        if _UnregisterHotKey(self._hwnd, hk_id):
             self.hotkey_ids.pop(hk_id, None)
             self.registered_dynamic_ids.discard(hk_id)
-            logger.debug(f"Unregistered dynamic hotkey ID {hk_id}")
+            logger.debug("Unregistered dynamic hotkey ID %d", hk_id)
 
     def nativeEvent(self, event_type, message):
+        # Called for every native message; peek at MSG.message and only read
+        # further fields for WM_HOTKEY instead of materializing the whole struct
         try:
             if event_type == b'windows_generic_MSG':
-                msg = wintypes.MSG.from_address(message.__int__())
-                if msg.message == 0x0312:  # WM_HOTKEY
-                    hk_id = msg.wParam
+                addr = int(message)
+                if ctypes.c_uint.from_address(addr + _MSG_MESSAGE_OFFSET).value == _WM_HOTKEY:
+                    hk_id = wintypes.WPARAM.from_address(addr + _MSG_WPARAM_OFFSET).value
                     if hk_id in self.hotkey_ids:
                         self.hotkey_ids[hk_id]()
                         return True, 0
         except Exception as e:
-            logger.error(f"Error in nativeEvent: {e}", exc_info=True)
+            logger.error("Error in nativeEvent: %s", e, exc_info=True)
         return super().nativeEvent(event_type, message)
 
     def _setup_shortcuts(self):
@@ -318,14 +598,17 @@ class MainWindow(PrivacyWindow):
     # ------------------------------------------------------------------
 
     def _handle_screenshot(self):
+        """
+        Stage 1: move the overlay out of the shot, then let the event loop
+        run while the compositor catches up; capture continues in stage 2.
+        """
+        if self._capture_pending:
+            return
         try:
-            from capture.screenshot import capture_screenshot
             from PySide6.QtWidgets import QApplication
-            import time as _time
 
             geo = self.geometry()
-            center_x = geo.x() + geo.width() // 2
-            center_y = geo.y() + geo.height() // 2
+            center = (geo.x() + geo.width() // 2, geo.y() + geo.height() // 2)
 
             self.set_privacy_mode(False)
             prev_pos = self.pos()
@@ -333,41 +616,69 @@ class MainWindow(PrivacyWindow):
             self.hide()
 
             QApplication.processEvents()
-            _time.sleep(0.5)
-            QApplication.processEvents()
+        except Exception as e:
+            logger.error("Screenshot error: %s", e, exc_info=True)
+            self.response_viewer.setText(f"Screenshot error: {e}")
+            return
 
-            self.current_image = capture_screenshot((center_x, center_y))
+        self._capture_pending = True
+        QTimer.singleShot(
+            self.CAPTURE_SETTLE_MS,
+            lambda: self._capture_stage2(center, prev_pos)
+        )
 
+    def _capture_stage2(self, center, prev_pos):
+        """Stage 2: grab the screen, then restore the overlay and show the result."""
+        try:
+            from capture.screenshot import capture_screenshot
+            self.current_image = capture_screenshot(center)
+        except Exception as e:
+            logger.error("Screenshot error: %s", e, exc_info=True)
+            self.current_image = None
+            self.response_viewer.setText(f"Screenshot error: {e}")
+            return
+        finally:
+            self._capture_pending = False
             self.move(prev_pos)
             self.show()
             self.setAttribute(_WA.WA_ShowWithoutActivating)
             self.set_privacy_mode(True)  # re-enable after screenshot
 
-            if self.current_image:
-                from PySide6.QtGui import QPixmap
-                import io
-                buf = io.BytesIO()
-                self.current_image.save(buf, format='PNG')
-                pixmap = QPixmap()
-                pixmap.loadFromData(buf.getvalue())
-                self.image_preview_label.setPixmap(
-                    pixmap.scaledToHeight(100, _TM.SmoothTransformation)
-                )
-                self.image_preview_label.show()
-                self.response_viewer.setText(
-                    "Screenshot captured!\nPress <b>Ctrl+Enter</b> to send."
-                )
-                from PySide6.QtCore import QTimer
-                QTimer.singleShot(50, self.adjust_height_to_content)
-                self._register_dynamic_hotkey(201)
-                logger.info("Screenshot captured and preview shown")
-            else:
-                logger.warning("Screenshot capture returned None")
-                self.response_viewer.setText("Screenshot failed — check logs.")
+        if self.current_image:
+            self.image_preview_label.setPixmap(self._preview_pixmap(self.current_image))
+            self.image_preview_label.show()
+            self.response_viewer.setText(
+                "Screenshot captured!\nPress <b>Ctrl+Enter</b> to send."
+            )
+            self._schedule_resize()
+            self._register_dynamic_hotkey(201)
+            logger.info("Screenshot captured and preview shown")
+        else:
+            logger.warning("Screenshot capture returned None")
+            self.response_viewer.setText("Screenshot failed — check logs.")
 
-        except Exception as e:
-            logger.error(f"Screenshot error: {e}", exc_info=True)
-            self.response_viewer.setText(f"Screenshot error: {e}")
+    @classmethod
+    def _preview_pixmap(cls, image, height: int = 100):
+        """
+        Thumbnail of a PIL screenshot: shrink in PIL, then hand Qt the raw
+        pixels instead of a PNG encode/decode round-trip.
+        """
+        from PIL import Image
+        from PySide6.QtGui import QPixmap, QImage
+        width = max(1, round(image.width * height / image.height))
+        preview = image.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if cls.PREVIEW_GRAYSCALE:
+            # 8 bpp instead of 32: a quarter of the bytes to upload and blit
+            preview = preview.convert("L")
+            data = preview.tobytes("raw", "L")
+            qimg = QImage(data, preview.width, preview.height, preview.width, QImage.Format.Format_Grayscale8)
+        else:
+            if preview.mode != "RGBA":
+                preview = preview.convert("RGBA")
+            data = preview.tobytes("raw", "RGBA")
+            qimg = QImage(data, preview.width, preview.height, preview.width * 4, QImage.Format.Format_RGBA8888)
+        # fromImage copies the pixels, so `data` may be freed afterwards
+        return QPixmap.fromImage(qimg)
 
     def _handle_send(self):
         if not hasattr(self, 'current_image') or not self.current_image:
@@ -376,79 +687,89 @@ class MainWindow(PrivacyWindow):
 
         self._unregister_dynamic_hotkey(201)
         self.image_preview_label.hide()
-        self.response_viewer.setHtml("Sending to LLM...")
+        self._show_html("Sending to LLM...")
 
-        from PySide6.QtCore import QTimer
-        QTimer.singleShot(50, self.adjust_height_to_content)
-        self.repaint()
+        self._schedule_resize()
 
         if self.llm_provider:
-            send_start = time.time()
-            try:
-                logger.info("Sending image to LLM provider...")
-                response = self.llm_provider.send_message(
-                    text="Analyze this image.",
-                    images=[self.current_image]
-                )
-                elapsed = time.time() - send_start
-                logger.info(f"LLM response received in {elapsed:.1f}s")
-
-                text_response = response.get('response', 'No response')
-
-                # Log metadata if available
-                metadata = response.get('metadata', {})
-                if metadata:
-                    logger.debug(f"Response metadata: model={metadata.get('model')}, timing={metadata.get('timing')}")
-
-                styled_html = self._render_markdown_to_html(text_response)
-                self.response_viewer.setHtml(styled_html)
-                QTimer.singleShot(100, self.adjust_height_to_content)
-
-            except Exception as e:
-                elapsed = time.time() - send_start
-                logger.error(f"LLM send failed after {elapsed:.1f}s: {e}", exc_info=True)
-                self.response_viewer.setText(f"Error: {e}")
+            # The GUI thread returns to the event loop right away; the reply
+            # arrives through the worker's queued signals
+            worker = _SendWorker(
+                self.llm_provider, self.current_image,
+                stream=self.settings.get("ui.stream_responses", False)
+            )
+            self._stream_cursor = None
+            worker.signals.chunk.connect(self._on_send_chunk)
+            worker.signals.finished.connect(self._on_send_finished)
+            worker.signals.failed.connect(self._on_send_failed)
+            # Keep the signal holder alive until its queued emit is delivered
+            self._send_signals = worker.signals
+            QThreadPool.globalInstance().start(worker)
         else:
             logger.warning("LLM provider not configured")
             self.response_viewer.setText("LLM not configured.")
 
-    def _render_markdown_to_html(self, md_text: str) -> str:
-        """Convert markdown text to styled HTML for the response viewer."""
+    def _on_send_chunk(self, chunk: str):
+        """Append streamed text as plain text; the markdown render replaces it at the end."""
+        if self.sender() is not self._send_signals:
+            return
+        if self._stream_cursor is None:
+            self.response_viewer.setPlainText("")
+            # One cursor for the whole stream; each insert leaves it at the end
+            self._stream_cursor = QTextCursor(self.response_viewer.document())
+            self._stream_cursor.movePosition(QTextCursor.MoveOperation.End)
+        self._stream_cursor.insertText(chunk)
+        self._schedule_resize()
+
+    def _on_send_finished(self, reply_html: str, elapsed: float):
+        if self.sender() is not self._send_signals:
+            return  # reset while the request was in flight
+        self._send_signals = None
+        self._stream_cursor = None
+        self._install_response_css()
+        self._show_html(reply_html)
+        self._schedule_resize(100)
+
+    def _show_html(self, html: str):
+        """
+        setHtml, skipped when the viewer already holds exactly this HTML
+        (repeated resets, a resync with the same reply) so the document is
+        not torn down and laid out again for nothing.
+        """
+        if html == self._shown_html:
+            return
+        self.response_viewer.setHtml(html)
+        # Assigned after setHtml, whose own textChanged clears the field
+        self._shown_html = html
+
+    def _forget_shown_html(self):
+        self._shown_html = None
+
+    def _install_response_css(self):
+        """
+        Give the viewer's document the reply stylesheet once; Qt applies a
+        default stylesheet to every later setHtml without it being resent.
+        """
+        if self._response_css_installed:
+            return
         try:
-            html_content = markdown.markdown(
-                md_text,
-                extensions=['fenced_code', 'codehilite']
-            )
+            css = _response_css()
         except Exception as e:
-            logger.warning(f"Markdown rendering failed, using plain text: {e}")
-            # Escape HTML and preserve newlines  
-            import html
-            html_content = html.escape(md_text).replace('\n', '<br>')
-
-        formatter = HtmlFormatter(style='monokai', noclasses=True)
-        pygments_css = formatter.get_style_defs('.codehilite')
-
-        return f"""
-        <style>
-            body {{ font-family: 'Segoe UI', sans-serif; color: #e0e0e0; margin: 0; }}
-            p {{ margin-bottom: 10px; margin-top: 0; }}
-            a {{ color: #4facfe; }}
-            pre {{
-                background-color: #272822;
-                padding: 12px;
-                border-radius: 6px;
-                border: 1px solid #444;
-                overflow-x: auto;
-                margin: 8px 0;
-                line-height: 1.2;
-            }}
-            pre * {{ margin: 0; padding: 0; }}
-            code {{ font-family: 'Consolas', 'Monaco', monospace; font-size: 13px; }}
-            p code {{ background-color: #3e3e3e; padding: 2px 5px; border-radius: 4px; }}
-            {pygments_css}
-        </style>
-        {html_content}
-        """
+            logger.warning("Pygments styles unavailable: %s", e)
+            css = _HTML_CSS
+        self.response_viewer.document().setDefaultStyleSheet(css)
+        self._response_css_installed = True
+
+    def _on_send_failed(self, error: str, elapsed: float):
+        if self.sender() is not self._send_signals:
+            return
+        self._send_signals = None
+        self._stream_cursor = None
+        self.response_viewer.setText(f"Error: {error}")
+
+    def _schedule_resize(self, ms: int = 50):
+        """Fit the window to its content once things settle (debounced)."""
+        self._resize_timer.start(ms)
 
     def adjust_height_to_content(self):
         """
@@ -457,37 +778,38 @@ class MainWindow(PrivacyWindow):
         """
         screen    = self.screen().availableGeometry()
         max_width = screen.width() // 2
-        overhead  = 60  # legend bar + layout margins
 
-        # Always use max width so content wraps as little as possible
-        self.response_viewer.document().setTextWidth(max_width - 40)
-        doc_h = self.response_viewer.document().size().height()
-        new_h = max(60, int(doc_h + overhead))
+        # One layout pass at max width gives both the height and the ideal
+        # width; no per-width probing
+        doc = self.response_viewer.document()
+        doc.setTextWidth(max_width - _TEXT_PAD_PX)
+        doc_h = doc.size().height()
+        new_h = max(_MIN_SIZE[1], math.ceil(doc_h) + _OVERHEAD_PX)
 
-        # Shrink width back down if content doesn't need the full half-screen
-        # Use ideal text width + some padding, capped at max_width
-        ideal_w = int(self.response_viewer.document().idealWidth()) + 40
-        new_w   = max(280, min(ideal_w, max_width))
+        # Shrink width back down if content doesn't need the full half-screen.
+        # Lines fit within idealWidth, so narrowing to it does not re-wrap.
+        # Round up: truncating could cost the widest line a wrap
+        ideal_w = math.ceil(doc.idealWidth()) + _TEXT_PAD_PX
+        new_w   = max(_MIN_SIZE[0], min(ideal_w, max_width))
 
         self.resize(new_w, new_h)
 
     @staticmethod
     def _apply_privacy(widget: QWidget):
         """Apply WDA_EXCLUDEFROMCAPTURE to any top-level widget (dialogs, etc.)"""
-        import ctypes
         hwnd = int(widget.winId())
         if hwnd:
-            ctypes.windll.user32.SetWindowDisplayAffinity(hwnd, 0x00000011)
+            PrivacyWindow._set_display_affinity(hwnd, WDA_EXCLUDEFROMCAPTURE)
 
     def _handle_reset(self):
         if hasattr(self, 'current_image'):
             del self.current_image
+        self._send_signals = None  # drop the reply of any in-flight send
         self.image_preview_label.clear()
         self.image_preview_label.hide()
-        self.response_viewer.setHtml("Listening...")
-        from PySide6.QtCore import QTimer
-        QTimer.singleShot(50, self.adjust_height_to_content)
-        self.move(20, 50)
+        self._show_html("Listening...")
+        self._schedule_resize()
+        self.move(*_TOAST_ORIGIN)
         self._unregister_dynamic_hotkey(201)
         logger.info("App reset")
 
@@ -503,22 +825,26 @@ class MainWindow(PrivacyWindow):
     def _toggle_privacy(self):
         self.privacy_enabled = not self.privacy_enabled
         self.set_privacy_mode(self.privacy_enabled)
-        if self.privacy_enabled:
-            self.status_label.setText("⬤")
-            self.status_label.setStyleSheet(
-                "color: #00ffca; font-size: 8px; background: transparent; padding: 2px;"
-            )
-        else:
-            self.status_label.setText("◯")
-            self.status_label.setStyleSheet(
-                "color: #ff4444; font-size: 8px; background: transparent; padding: 2px;"
-            )
+        # Both colours live in the container sheet; flipping the property and
+        # re-polishing re-matches them without parsing a new stylesheet
+        self.status_label.setText("⬤" if self.privacy_enabled else "◯")
+        self.status_label.setProperty("privacy", "on" if self.privacy_enabled else "off")
+        self.status_label.style().unpolish(self.status_label)
+        self.status_label.style().polish(self.status_label)
         self.status_label.adjustSize()
-        self.resizeEvent(None)
+        self._place_status_label()
 
     def move_window(self, dx, dy):
+        # Held arrows auto-repeat WM_HOTKEY; accumulate and move once per frame
+        self._pending_dx += dx
+        self._pending_dy += dy
+        if not self._move_timer.isActive():
+            self._move_timer.start()
+
+    def _flush_move(self):
         pos = self.pos()
-        self.move(pos.x() + dx, pos.y() + dy)
+        self.move(pos.x() + self._pending_dx, pos.y() + self._pending_dy)
+        self._pending_dx = self._pending_dy = 0
 
     # ------------------------------------------------------------------
     # LLM Init
@@ -529,23 +855,25 @@ class MainWindow(PrivacyWindow):
         api_key = self.settings.get_api_key(provider_name)
 
         if not api_key:
-            logger.warning(f"No API key found for {provider_name}")
+            logger.warning("No API key found for %s", provider_name)
             self._prompt_for_api_key(provider_name)
             return
 
+        max_edge = self.settings.get("llm.max_image_edge", DEFAULT_MAX_IMAGE_EDGE)
+
         try:
             if provider_name == "gemini":
                 model = self.settings.get("llm.gemini_model", "gemini-3.1-flash-lite-preview")
-                logger.info(f"Initializing Gemini provider with model: {model}")
-                self.llm_provider = SmartGeminiProvider(api_key, model)
+                logger.info("Initializing Gemini provider with model: %s", model)
+                self.llm_provider = SmartGeminiProvider(api_key, model, max_image_edge=max_edge)
             elif provider_name == "claude":
                 model = self.settings.get("llm.claude_model", "claude-3-5-sonnet-20241022")
-                logger.info(f"Initializing Claude provider with model: {model}")
-                self.llm_provider = ClaudeProvider(api_key, model)
+                logger.info("Initializing Claude provider with model: %s", model)
+                self.llm_provider = ClaudeProvider(api_key, model, max_image_edge=max_edge)
             else:
-                logger.error(f"Unknown provider: {provider_name}")
+                logger.error("Unknown provider: %s", provider_name)
         except Exception as e:
-            logger.error(f"Error initializing LLM provider: {e}", exc_info=True)
+            logger.error("Error initializing LLM provider: %s", e, exc_info=True)
             msg = QMessageBox(self)
             msg.setWindowTitle("LLM Error")
             msg.setText(f"Failed to initialize {provider_name}: {e}")
@@ -10,6 +10,7 @@ Requires Windows 10 version 2004 (build 19041) or later.
 
 import ctypes
 import logging
+import sys
 from ctypes import wintypes
 from PySide6.QtWidgets import QWidget
 from PySide6.QtCore import Qt
@@ -24,6 +25,26 @@ GWL_EXSTYLE          = -20
 WS_EX_TRANSPARENT    = 0x00000020
 WS_EX_LAYERED        = 0x00080000
 
+# user32 entry points resolved once with explicit signatures, so ctypes skips
+# per-call argument inference and LONG_PTR styles are not truncated to c_int.
+# use_last_error makes ctypes.get_last_error() report the real failure code.
+if sys.platform == "win32":
+    _user32 = ctypes.WinDLL("user32", use_last_error=True)
+
+    _SetWindowDisplayAffinity = _user32.SetWindowDisplayAffinity
+    _SetWindowDisplayAffinity.argtypes = [wintypes.HWND, wintypes.DWORD]
+    _SetWindowDisplayAffinity.restype = wintypes.BOOL
+
+    # The *Ptr variants only exist in 64-bit user32; 32-bit headers alias them
+    # to the plain LONG versions, which are pointer-sized there anyway
+    _GetWindowLongPtrW = getattr(_user32, "GetWindowLongPtrW", _user32.GetWindowLongW)
+    _GetWindowLongPtrW.argtypes = [wintypes.HWND, ctypes.c_int]
+    _GetWindowLongPtrW.restype = ctypes.c_ssize_t
+
+    _SetWindowLongPtrW = getattr(_user32, "SetWindowLongPtrW", _user32.SetWindowLongW)
+    _SetWindowLongPtrW.argtypes = [wintypes.HWND, ctypes.c_int, ctypes.c_ssize_t]
+    _SetWindowLongPtrW.restype = ctypes.c_ssize_t
+
 
 class PrivacyWindow(QWidget):
     """
@@ -56,22 +77,26 @@ class PrivacyWindow(QWidget):
         """
         try:
             hwnd     = self._get_hwnd()
-            user32   = ctypes.windll.user32
             affinity = WDA_EXCLUDEFROMCAPTURE if enabled else WDA_NONE
 
-            result = user32.SetWindowDisplayAffinity(hwnd, affinity)
+            result = _SetWindowDisplayAffinity(hwnd, affinity)
             if result == 0:
                 err = ctypes.get_last_error()
-                logger.warning(f"SetWindowDisplayAffinity failed (error {err})")
+                logger.warning("SetWindowDisplayAffinity failed (error %s)", err)
             else:
-                logger.info(f"Privacy mode {'enabled' if enabled else 'disabled'}")
+                logger.info("Privacy mode %s", 'enabled' if enabled else 'disabled')
 
         except RuntimeError as e:
             # HWND not ready — will retry on next showEvent
-            logger.debug(f"Privacy mode deferred: {e}")
+            logger.debug("Privacy mode deferred: %s", e)
             self._privacy_pending = enabled
         except Exception as e:
-            logger.error(f"Error toggling privacy mode: {e}", exc_info=True)
+            logger.error("Error toggling privacy mode: %s", e, exc_info=True)
+
+    @staticmethod
+    def _set_display_affinity(hwnd: int, affinity: int) -> bool:
+        """SetWindowDisplayAffinity through the typed binding; True on success."""
+        return bool(_SetWindowDisplayAffinity(hwnd, affinity))
 
     def _apply_display_affinity(self):
         self.set_privacy_mode(True)
@@ -85,16 +110,15 @@ class PrivacyWindow(QWidget):
         """Toggle click-through (mouse events pass to the window behind)."""
         try:
             hwnd   = self._get_hwnd()
-            user32 = ctypes.windll.user32
-            style  = user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
+            style  = _GetWindowLongPtrW(hwnd, GWL_EXSTYLE)
 
             if enabled:
                 new_style = style | WS_EX_TRANSPARENT | WS_EX_LAYERED
             else:
                 new_style = style & ~WS_EX_TRANSPARENT  # keep WS_EX_LAYERED for opacity
 
-            user32.SetWindowLongW(hwnd, GWL_EXSTYLE, new_style)
-            logger.debug(f"Click-through {'enabled' if enabled else 'disabled'}")
+            _SetWindowLongPtrW(hwnd, GWL_EXSTYLE, new_style)
+            logger.debug("Click-through %s", 'enabled' if enabled else 'disabled')
 
         except Exception as e:
-            logger.error(f"Error setting click-through: {e}", exc_info=True)
\ No newline at end of file
+            logger.error("Error setting click-through: %s", e, exc_info=True)
\ No newline at end of file
@@ -12,10 +12,128 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
     QPushButton, QLabel, QFileDialog, QScrollArea
 )
-from PySide6.QtCore import Signal, Qt, QSize
-from PySide6.QtGui import QKeySequence, QShortcut, QPixmap
-from PIL import Image
+from PySide6.QtCore import (
+    Signal, Qt, QSize, QObject, QRunnable, QThreadPool, QTimer, QBuffer, QByteArray
+)
+from PySide6.QtGui import QKeySequence, QShortcut, QPixmap, QImage, QImageReader
 import io
+import logging
+from collections import deque
+from typing import TYPE_CHECKING
+
+# PIL (and its codec libraries) is imported on first use rather than with the
+# panel: most sessions attach nothing from this panel, and decodes prefer Qt
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Edge of the attachment preview labels, in logical pixels
+THUMBNAIL_SIZE = 100
+
+# Extensions offered by the image dialog and accepted from drops
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+
+
+def _thumbnail_image(img: "Image.Image") -> QImage:
+    """
+    Scaled preview of `img` as a QImage that owns its pixels. Uses no
+    QPixmap, so it is safe to build on a worker thread.
+    """
+    # Shrink in PIL first so only a small buffer crosses into Qt. 2x the
+    # label size keeps the final scale crisp on high-DPI screens.
+    edge = THUMBNAIL_SIZE * 2
+    if max(img.size) > edge:
+        from PIL import Image
+        ratio = edge / max(img.size)
+        size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+        # resize() returns a new image: the attachment itself stays full size
+        img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    # Hand Qt the raw pixels directly instead of a PNG encode/decode round-trip
+    rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+    data = rgba.tobytes("raw", "RGBA")
+    qimg = QImage(data, rgba.width, rgba.height, rgba.width * 4, QImage.Format.Format_RGBA8888)
+
+    # LANCZOS already did the filtering, so the last <=2x step can be nearest-neighbour.
+    # QImage wraps `data` without copying, and scaled() hands back a shallow
+    # copy when the size is unchanged, so copy() detaches it from the buffer
+    # before the image leaves this thread
+    return qimg.scaled(
+        THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+        Qt.AspectRatioMode.KeepAspectRatio,
+        Qt.TransformationMode.FastTransformation
+    ).copy()
+
+
+def _encode_attachment(img: "Image.Image", buf: io.BytesIO) -> dict:
+    """
+    Attachment entry holding the image losslessly encoded instead of decoded
+    (~compressed size rather than W*H*4 bytes); decoded again only on send.
+    compress_level=1 keeps the one-off encode fast for large screenshots.
+    `buf` is a reusable scratch buffer; the entry gets its own copy.
+    """
+    buf.seek(0)
+    buf.truncate()
+    img.save(buf, format='PNG', compress_level=1)
+    return {'bytes': buf.getvalue(), 'format': 'PNG', 'size': img.size}
+
+
+class _ImageLoadSignals(QObject):
+    loaded = Signal(object, object)  # attachment entry (no thumb yet), thumbnail QImage
+    failed = Signal(str)
+
+
+class _ImageLoadTask(QRunnable):
+    """Reads an image file and builds its preview off the GUI thread."""
+
+    def __init__(self, file_path: str):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = _ImageLoadSignals()
+
+    def run(self):
+        try:
+            with open(self.file_path, 'rb') as f:
+                data = f.read()
+            entry = {'bytes': data, 'path': self.file_path}
+
+            # Formats Qt decodes natively (the dialog's whole filter set) skip PIL
+            # entirely; QImage, unlike QPixmap, is safe to use off the GUI thread
+            device = QBuffer()
+            device.setData(QByteArray(data))
+            reader = QImageReader(device)
+            full = reader.size()  # header only, nothing decoded yet
+            qimg = QImage()
+            if full.isValid():
+                # Decode at preview scale: the JPEG handler turns this into a
+                # 1/2-1/8 scale IDCT, other formats get one smooth downscale
+                edge = THUMBNAIL_SIZE * 2
+                if max(full.width(), full.height()) > edge:
+                    reader.setScaledSize(full.scaled(edge, edge, Qt.AspectRatioMode.KeepAspectRatio))
+                qimg = reader.read()
+
+            if not qimg.isNull():
+                entry['format'] = bytes(reader.format()).decode().upper()
+                entry['size'] = (full.width(), full.height())
+                thumb = qimg.scaled(
+                    THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.FastTransformation
+                )
+            else:
+                from PIL import Image
+                img = Image.open(io.BytesIO(data))
+                entry['format'] = img.format
+                entry['size'] = img.size
+                # Only the preview is decoded; JPEG can decode straight at reduced scale
+                if img.format == "JPEG":
+                    img.draft("RGB", (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+                thumb = _thumbnail_image(img)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.loaded.emit(entry, thumb)
 
 
 class InputPanel(QWidget):
@@ -23,13 +141,40 @@ class InputPanel(QWidget):
 
     send_requested = Signal(dict)
 
+    # Installed once on the panel; recording buttons restyle through the dynamic
+    # "recording" property instead of handing Qt a new sheet to parse per toggle
+    _STYLE = """
+        QPushButton#sendButton {
+            background-color: #4682d4;
+            color: white;
+            font-weight: bold;
+            padding: 8px 20px;
+        }
+        QPushButton#sendButton:hover { background-color: #5792e4; }
+        QPushButton#sendButton:pressed { background-color: #3672c4; }
+        QPushButton[recording="true"] { background-color: #c42b1c; }
+    """
+
     def __init__(self):
         super().__init__()
+        # Attachment entries: {'bytes', 'format', 'size', 'thumb'} (+ 'path' for
+        # files); PIL images are only constructed again on send
         self._images = []
+        self._preview_labels = []  # parallel to self._images
+        self._pending_previews = []  # appended entries whose labels are not built yet
         self._audio_file = None
+        # In-flight _ImageLoadTasks: signal holder -> (generation, slot)
+        self._load_signals = {}
+        # Bumped by Clear and Send; loads started before then are dropped
+        self._load_generation = 0
+        # Attachment slots in the order images were added: {'entry', 'done'}
+        self._load_slots = deque()
+        self._png_scratch = io.BytesIO()  # reused by every add_image encode
         self._setup_ui()
+        self.setAcceptDrops(True)
 
     def _setup_ui(self):
+        self.setStyleSheet(self._STYLE)
         layout = QVBoxLayout(self)
         layout.setContentsMargins(10, 10, 10, 10)
 
@@ -52,9 +197,7 @@ class InputPanel(QWidget):
         self.attachments_area.setMaximumHeight(120)
         self.attachments_area.setWidgetResizable(True)
         self.attachments_area.setVisible(False)
-        self.attachments_widget = QWidget()
-        self.attachments_layout = QHBoxLayout(self.attachments_widget)
-        self.attachments_area.setWidget(self.attachments_widget)
+        self._reset_attachments_widget()
         layout.addWidget(self.attachments_area)
 
         # Buttons bar
@@ -84,100 +227,198 @@ class InputPanel(QWidget):
 
         self.send_btn = QPushButton("✉️ Send")
         self.send_btn.setToolTip("Send message (Ctrl+Enter)")
-        self.send_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #4682d4;
-                color: white;
-                font-weight: bold;
-                padding: 8px 20px;
-            }
-            QPushButton:hover { background-color: #5792e4; }
-            QPushButton:pressed { background-color: #3672c4; }
-        """)
+        self.send_btn.setObjectName("sendButton")
         self.send_btn.clicked.connect(self._send_message)
         buttons_layout.addWidget(self.send_btn)
 
         layout.addLayout(buttons_layout)
 
-        send_shortcut = QShortcut(QKeySequence("Ctrl+Return"), self)
-        send_shortcut.activated.connect(self._send_message)
+        # Coalesces bursts of additions into one preview update; start() while
+        # active just keeps the single pending timeout
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(0)
+        self._preview_timer.timeout.connect(self._flush_previews)
+
+        # Built from enums rather than parsing "Ctrl+Return"; queued so the send
+        # runs after the key event has been fully delivered
+        send_shortcut = QShortcut(QKeySequence(Qt.Modifier.CTRL | Qt.Key.Key_Return), self)
+        send_shortcut.activated.connect(self._send_message, Qt.ConnectionType.QueuedConnection)
 
     def add_image(self, image):
+        try:
+            from PIL import Image
+        except ImportError:
+            return
         if isinstance(image, Image.Image):
-            self._images.append(image)
-            self._update_attachments_preview()
+            slot = self._reserve_slot()
+            entry = _encode_attachment(image, self._png_scratch)
+            entry['thumb'] = self._make_thumbnail(image)
+            self._fill_slot(slot, entry)
 
     def _add_image_from_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self, "Select Image", "",
-            "Images (*.png *.jpg *.jpeg *.bmp *.gif)"
+            "Images (%s)" % " ".join("*" + ext for ext in _IMAGE_EXTS)
         )
         if file_path:
-            try:
-                self.add_image(Image.open(file_path))
-            except Exception as e:
-                print(f"Error loading image: {e}")
+            self._load_image_file(file_path)
+
+    def _load_image_file(self, file_path: str):
+        """Decode a file and its preview on the pool; several may run in parallel."""
+        task = _ImageLoadTask(file_path)
+        task.signals.loaded.connect(self._on_image_loaded)
+        task.signals.failed.connect(self._on_image_failed)
+        # Keep the signal holder alive until its queued emit is delivered
+        self._load_signals[task.signals] = (self._load_generation, self._reserve_slot())
+        QThreadPool.globalInstance().start(task)
+
+    @staticmethod
+    def _dropped_images(mime_data):
+        """Local image file paths in a drag payload."""
+        if not mime_data.hasUrls():
+            return []
+        return [
+            path for path in (u.toLocalFile() for u in mime_data.urls())
+            if path and path.lower().endswith(_IMAGE_EXTS)
+        ]
+
+    def dragEnterEvent(self, event):
+        if self._dropped_images(event.mimeData()):
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
+    def dropEvent(self, event):
+        for path in self._dropped_images(event.mimeData()):
+            self._load_image_file(path)
+        event.acceptProposedAction()
+
+    def _on_image_loaded(self, entry, thumb):
+        generation, slot = self._load_signals.pop(self.sender(), (None, None))
+        if generation != self._load_generation:
+            return  # cleared or sent while the file was loading
+        entry['thumb'] = QPixmap.fromImage(thumb)
+        self._fill_slot(slot, entry)
+
+    def _on_image_failed(self, error: str):
+        generation, slot = self._load_signals.pop(self.sender(), (None, None))
+        logger.warning("Error loading image: %s", error)
+        if generation == self._load_generation:
+            self._fill_slot(slot, None)
+
+    def _reserve_slot(self) -> dict:
+        """Place for an attachment in addition order, filled when it is ready."""
+        slot = {'entry': None, 'done': False}
+        self._load_slots.append(slot)
+        return slot
+
+    def _fill_slot(self, slot: dict, entry):
+        """
+        Complete a slot (entry None for a failed load) and attach every
+        finished slot at the head of the queue, so attachments keep the order
+        they were picked in even when later files load first.
+        """
+        slot['entry'] = entry
+        slot['done'] = True
+        while self._load_slots and self._load_slots[0]['done']:
+            ready = self._load_slots.popleft()['entry']
+            if ready is not None:
+                self._images.append(ready)
+                self._queue_preview(ready)
+
+    @staticmethod
+    def _set_recording(button: QPushButton, recording: bool):
+        # Re-polish so the panel sheet's [recording] rule is re-matched
+        button.setProperty("recording", recording)
+        button.style().unpolish(button)
+        button.style().polish(button)
 
     def _toggle_mic_recording(self):
         if self.mic_btn.text() == "🎤 Microphone":
             self.mic_btn.setText("⏹️ Stop Recording")
-            self.mic_btn.setStyleSheet("background-color: #c42b1c;")
+            self._set_recording(self.mic_btn, True)
         else:
             self.mic_btn.setText("🎤 Microphone")
-            self.mic_btn.setStyleSheet("")
+            self._set_recording(self.mic_btn, False)
 
     def _toggle_system_audio_recording(self):
         if self.system_audio_btn.text() == "🔊 System Audio":
             self.system_audio_btn.setText("⏹️ Stop Recording")
-            self.system_audio_btn.setStyleSheet("background-color: #c42b1c;")
+            self._set_recording(self.system_audio_btn, True)
         else:
             self.system_audio_btn.setText("🔊 System Audio")
-            self.system_audio_btn.setStyleSheet("")
-
-    def _update_attachments_preview(self):
-        # Clear existing previews
-        while self.attachments_layout.count():
-            item = self.attachments_layout.takeAt(0)
-            w = item.widget()
-            if w is not None:           # fix: guard before calling deleteLater
-                w.deleteLater()
-
-        self.attachments_area.setVisible(len(self._images) > 0)
-
-        for i, img in enumerate(self._images):
-            buf = io.BytesIO()
-            img.save(buf, format='PNG')
-            pixmap = QPixmap()
-            pixmap.loadFromData(buf.getvalue())
-
-            # fix: use proper v6 enum namespaces
-            thumbnail = pixmap.scaled(
-                100, 100,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-
-            lbl = QLabel()
-            lbl.setPixmap(thumbnail)
-            lbl.setToolTip(f"Image {i + 1}")
-            lbl.setStyleSheet("border: 1px solid #555; padding: 2px;")
-            self.attachments_layout.addWidget(lbl)
-
-        self.attachments_layout.addStretch()
+            self._set_recording(self.system_audio_btn, False)
+
+    def _queue_preview(self, entry):
+        self._pending_previews.append(entry)
+        self._preview_timer.start()
+
+    def _flush_previews(self):
+        """Build labels for all attachments added since the last flush, in one layout pass."""
+        pending, self._pending_previews = self._pending_previews, []
+        if not pending:
+            return
+        self.attachments_widget.setUpdatesEnabled(False)
+        for entry in pending:
+            self._append_preview(entry)
+        self.attachments_widget.setUpdatesEnabled(True)
+        self.attachments_area.setVisible(True)
+
+    def _append_preview(self, entry):
+        """Add one preview label for a newly appended attachment."""
+        lbl = QLabel()
+        lbl.setPixmap(entry['thumb'])
+        lbl.setToolTip(f"Image {len(self._preview_labels) + 1}")
+        lbl.setStyleSheet("border: 1px solid #555; padding: 2px;")
+        # Insert before the trailing stretch
+        self.attachments_layout.insertWidget(self.attachments_layout.count() - 1, lbl)
+        self._preview_labels.append(lbl)
+
+    def _reset_attachments_widget(self):
+        """
+        Install a fresh, empty preview container. setWidget() deletes the old
+        one with all its labels as one subtree instead of label by label.
+        """
+        self.attachments_widget = QWidget()
+        self.attachments_layout = QHBoxLayout(self.attachments_widget)
+        self.attachments_layout.addStretch()  # previews are inserted before this
+        self.attachments_area.setWidget(self.attachments_widget)
+
+    def _clear_previews(self):
+        self._preview_timer.stop()
+        self._pending_previews.clear()
+        if self._preview_labels:
+            self._preview_labels.clear()
+            self._reset_attachments_widget()
+        self.attachments_area.setVisible(False)
+
+    @staticmethod
+    def _make_thumbnail(img) -> QPixmap:
+        return QPixmap.fromImage(_thumbnail_image(img))
 
     def _clear_all(self):
         self.text_input.clear()
         self._images.clear()
+        # Loads still in flight belong to the cleared (or sent) message
+        self._load_generation += 1
+        self._load_slots.clear()
         self._audio_file = None
-        self._update_attachments_preview()
+        self._clear_previews()
 
     def _send_message(self):
         text = self.text_input.toPlainText().strip()
         if not text and not self._images and not self._audio_file:
             return
+        # Take ownership of the attachment list rather than copying it; the
+        # panel starts over with a fresh list
+        entries, self._images = self._images, []
+        if entries:
+            from PIL import Image
+        audio_file = self._audio_file
+        self._clear_all()
         self.send_requested.emit({
             'text': text,
-            'images': self._images.copy(),
-            'audio': self._audio_file,
-        })
-        self._clear_all()
\ No newline at end of file
+            'images': [Image.open(io.BytesIO(entry.pop('bytes'))) for entry in entries],
+            'audio': audio_file,
+        })
\ No newline at end of file
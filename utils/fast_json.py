@@ -0,0 +1,48 @@
+"""
+Fast JSON Helpers
+
+Thin wrapper that uses orjson when installed and falls back to the stdlib
+json module otherwise. orjson decode errors subclass json.JSONDecodeError,
+so callers can keep catching the stdlib exception.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+    _HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    _HAS_ORJSON = False
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON document from str or UTF-8 bytes."""
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (2-space indent when indent=True)."""
+    if _HAS_ORJSON:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return dumps(obj, indent=indent, sort_keys=sort_keys).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    """Serialize to a JSON str (2-space indent when indent=True)."""
+    if _HAS_ORJSON:
+        return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode('utf-8')
+    return json.dumps(
+        obj,
+        indent=2 if indent else None,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+    )
@@ -4,7 +4,68 @@ File Handler Utilities
 Read various document formats and extract text content
 """
 
+import functools
+import logging
+import mmap
 import os
+import threading
+from typing import Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Text files at least this large are decoded from a memory map
+MMAP_TEXT_BYTES = 1 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def _pdfium():
+    """pypdfium2 (PDFium bindings) when installed, else None; imported on first PDF."""
+    try:
+        import pypdfium2
+        return pypdfium2
+    except ImportError:
+        return None
+
+
+# PDFium is not thread-safe; documents may be opened from several loader threads
+_pdfium_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_reader_cls():
+    """Import pypdf on the first PDF and keep the class for later reads."""
+    from pypdf import PdfReader
+    return PdfReader
+
+
+def _open_pdf_reader(file_path: str):
+    """
+    pypdf reader for text extraction. strict=False (and extraction_mode
+    'plain' at the call sites) are already pypdf 4's defaults; they are
+    passed explicitly so the tolerant, non-layout behaviour stays pinned.
+    Only page text is read; metadata, images and forms are never touched.
+    """
+    return _pdf_reader_cls()(file_path, strict=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _docx_document_cls():
+    """Import python-docx on the first DOCX and keep the class for later reads."""
+    from docx import Document
+    return Document
+
+
+def _ext(path: str) -> str:
+    """
+    Lower-cased extension including the dot, like os.path.splitext(path)[1]
+    but with two rfind() calls instead of splitext's general-purpose parsing.
+    """
+    dot = path.rfind('.')
+    sep = max(path.rfind('/'), path.rfind('\\'))
+    # A dot in a directory name, or a leading dot (".env"), is no extension
+    if dot <= sep + 1:
+        return ''
+    return path[dot:].lower()
 
 
 def read_document(file_path: str) -> str:
@@ -18,72 +79,196 @@ def read_document(file_path: str) -> str:
     Returns:
         Extracted text content
     """
-    ext = os.path.splitext(file_path)[1].lower()
-    
-    if ext == '.txt' or ext == '.md':
-        return _read_text_file(file_path)
-    elif ext == '.pdf':
-        return _read_pdf(file_path)
-    elif ext == '.docx':
-        return _read_docx(file_path)
-    else:
+    ext = _ext(file_path)
+    reader = _READERS.get(ext)
+    if reader is None:
         raise ValueError(f"Unsupported file type: {ext}")
+    return reader(file_path)
 
 
-def _read_text_file(file_path: str) -> str:
-    """Read plain text file"""
+def iter_document_pages(file_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, text) pairs as each page is extracted, so callers
+    can index or embed a large PDF without holding all of its text at once.
+    Non-PDF documents come out as a single page 1. Unsupported types raise
+    ValueError on the first next().
+    
+    Args:
+        file_path: Path to the document
+    
+    Yields:
+        1-based page number and that page's text
+    """
+    ext = _ext(file_path)
+    if ext != ".pdf":
+        reader = _READERS.get(ext)
+        if reader is None:
+            raise ValueError(f"Unsupported file type: {ext}")
+        yield 1, reader(file_path)
+        return
+
+    done = 0
+    pdfium = _pdfium()
+    if pdfium is not None:
+        try:
+            for page_no, text in _iter_pdf_pages_pdfium(pdfium, file_path):
+                yield page_no, text
+                done = page_no
+            return
+        except Exception as e:
+            # pypdf picks up at the page PDFium failed on
+            logger.warning("PDFium failed on %s, falling back to pypdf: %s", file_path, e)
+    yield from _iter_pdf_pages_pypdf(file_path, done)
+
+
+def _decode_text(data) -> str:
+    """
+    UTF-8, falling back to latin-1 (which accepts any byte) on the same buffer.
+    Line endings are normalized to LF, as text-mode open() would do.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        text = str(data, 'utf-8')
     except UnicodeDecodeError:
-        # Try with different encoding
-        with open(file_path, 'r', encoding='latin-1') as f:
-            return f.read()
+        text = str(data, 'latin-1')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def _read_text_file(file_path: str) -> str:
+    """Read plain text file; the file is read once and decoded in memory"""
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_TEXT_BYTES:
+            return _decode_text(f.read())
+        # Decode straight from the mapped pages, skipping the bytes copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _decode_text(mapped)
 
 
 def _read_pdf(file_path: str) -> str:
-    """Read PDF file and extract text"""
+    """
+    Read PDF file and extract text. PDFium is used when available, being
+    several times faster than pypdf; pypdf remains the fallback.
+    """
+    pdfium = _pdfium()
+    if pdfium is not None:
+        try:
+            return _read_pdf_pdfium(pdfium, file_path)
+        except Exception as e:
+            logger.warning("PDFium failed on %s, falling back to pypdf: %s", file_path, e)
+    return _read_pdf_pypdf(file_path)
+
+
+def _read_pdf_pdfium(pdfium, file_path: str) -> str:
+    """Extract text with pypdfium2, page by page, in the same layout as pypdf."""
+    return "\n".join(
+        f"--- Page {page_no} ---\n{text}\n"
+        for page_no, text in _iter_pdf_pages_pdfium(pdfium, file_path)
+    )
+
+
+def _iter_pdf_pages_pdfium(pdfium, file_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    (page number, text) per page via pypdfium2. The lock is taken per call
+    into PDFium rather than across yields, so a slow consumer does not
+    block other loader threads.
+    """
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(file_path)
+        page_count = len(pdf)
     try:
-        from pypdf import PdfReader
-        
-        reader = PdfReader(file_path)
-        text_parts = []
-        
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            text_parts.append(f"--- Page {i+1} ---\n{text}\n")
-        
-        return "\n".join(text_parts)
+        for i in range(page_count):
+            with _pdfium_lock:
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+            yield i + 1, text
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+
+def _iter_pdf_pages_pypdf(file_path: str, start: int = 0) -> Iterator[Tuple[int, str]]:
+    """(page number, text) per page via pypdf, beginning after page `start`."""
+    reader = _open_pdf_reader(file_path)
+    for i in range(start, len(reader.pages)):
+        yield i + 1, reader.pages[i].extract_text(extraction_mode='plain')
+
+
+def _read_pdf_pypdf(file_path: str) -> str:
+    """
+    Extract text with pypdf (pure Python), serially. This is only the
+    fallback when PDFium is missing or fails, so it does not get a process
+    pool: spawned workers would each re-import and re-parse the whole PDF,
+    and a PdfReader cannot be shared across threads.
+    """
+    try:
+        return "\n".join(
+            f"--- Page {page_no} ---\n{text}\n"
+            for page_no, text in _iter_pdf_pages_pypdf(file_path)
+        )
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
 
+# WordprocessingML tags, in lxml's Clark notation
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_T, _W_TAB, _W_BR, _W_CR = (_W + tag for tag in ("p", "t", "tab", "br", "cr"))
+
+
+def _paragraph_text(p) -> str:
+    """Text of a <w:p> element, rendering tabs and breaks like Paragraph.text."""
+    return "".join(
+        (el.text or "") if el.tag == _W_T else ("\t" if el.tag == _W_TAB else "\n")
+        for el in p.iter(_W_T, _W_TAB, _W_BR, _W_CR)
+    )
+
+
 def _read_docx(file_path: str) -> str:
-    """Read DOCX file and extract text"""
+    """
+    Read DOCX file and extract text. Walks the body's <w:p> elements with
+    lxml directly instead of building a python-docx Paragraph per paragraph.
+    """
     try:
-        from docx import Document
-        
-        doc = Document(file_path)
-        text_parts = []
-        
-        for paragraph in doc.paragraphs:
-            text_parts.append(paragraph.text)
-        
-        return "\n".join(text_parts)
+        doc = _docx_document_cls()(file_path)
+        # Top-level paragraphs only, the same set doc.paragraphs yields;
+        # empty ones are dropped rather than emitted as blank lines
+        paragraphs = (_paragraph_text(p) for p in doc.element.body.iterchildren(_W_P))
+        return "\n".join(text for text in paragraphs if text)
     except Exception as e:
         return f"Error reading DOCX: {str(e)}"
 
 
-def validate_file_type(file_path: str, allowed_extensions: list) -> bool:
+# Extension -> reader; new formats register here. Parsers stay lazily imported
+_READERS = {
+    '.txt': _read_text_file,
+    '.md': _read_text_file,
+    '.pdf': _read_pdf,
+    '.docx': _read_docx,
+}
+
+# Extensions read_document can parse; file pickers and drop targets share it
+SUPPORTED_DOCUMENT_EXTS = frozenset(_READERS)
+
+
+def validate_file_type(file_path: str, allowed_extensions) -> bool:
     """
     Check if file has allowed extension.
     
     Args:
         file_path: Path to file
-        allowed_extensions: List of allowed extensions (e.g., ['.pdf', '.txt'])
+        allowed_extensions: Allowed extensions (e.g., SUPPORTED_DOCUMENT_EXTS
+            or ['.pdf', '.txt']); sets are used as-is, other iterables are
+            converted so the lookup is a hash probe
     
     Returns:
         True if file type is allowed
     """
-    ext = os.path.splitext(file_path)[1].lower()
-    return ext in allowed_extensions
+    if not isinstance(allowed_extensions, (set, frozenset)):
+        allowed_extensions = frozenset(allowed_extensions)
+    return _ext(file_path) in allowed_extensions